@@ -0,0 +1,93 @@
+from __future__ import annotations
+from datetime import datetime
+from uuid import UUID
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+
+from app.api.deps import get_current_superuser
+from app.core.db import get_read_pool
+from app.core.events import auth_events
+from app.core.logger import get_logger
+from app.core.config import settings
+from app.core.profiling import ProfiledRoute, profiler
+from app.core.security import token_cache
+from app.core.singleflight import flight
+from app.core.slow_queries import slow_queries
+from app.models.admin import (AuthEventOut, AuthEventsExport, MetricsOut, ProfilingConfig, ProfilingState,
+                              SingleFlightKey, SingleFlightStats, SlowQueriesExport)
+from app.repositories.auth_events import AuthEventsRepo
+from app.repositories.refresh_tokens import issue_batcher_stats
+from app.docs.admin_docs import AdminDocs
+
+router = APIRouter(route_class=ProfiledRoute)
+log = get_logger()
+
+
+@router.get("/auth-events", **AdminDocs.auth_events)
+async def export_auth_events(request: Request,
+                             limit: int = Query(100, ge=1, le=10000),
+                             event_type: str | None = None,
+                             user_id: UUID | None = None,
+                             since: datetime | None = None,
+                             admin = Depends(get_current_superuser)) -> AuthEventsExport:
+    """Выгрузка auth-событий для аудита. Только для суперпользователя."""
+
+    pool = get_read_pool(request.app)
+    rows = await AuthEventsRepo(pool).recent(limit=limit, event_type=event_type, user_id=user_id, since=since)
+    events = [AuthEventOut(**{**r, "user_id": str(r["user_id"]) if r["user_id"] else None}) for r in rows]
+    return AuthEventsExport(stats=auth_events.stats(), events=events)
+
+
+@router.get("/profiling", **AdminDocs.profiling_get)
+async def get_profiling(admin = Depends(get_current_superuser)) -> ProfilingState:
+    """Состояние режима профилирования и последние профили (этого воркера)."""
+
+    return _profiling_state()
+
+
+@router.put("/profiling", **AdminDocs.profiling_set)
+async def set_profiling(body: ProfilingConfig, admin = Depends(get_current_superuser)) -> ProfilingState:
+    """Включаем/выключаем профилирование. Действует только на воркер, который принял запрос."""
+
+    profiler.enabled = body.enabled
+    profiler.sample_rate = body.sample_rate
+    profiler.cprofile = body.cprofile
+    log.info("profiling updated by=%s enabled=%s sample_rate=%s cprofile=%s",
+             str(admin["id"]), body.enabled, body.sample_rate, body.cprofile)
+    return _profiling_state()
+
+
+@router.get("/profiling/dumps/{record_id}", **AdminDocs.profiling_dump)
+async def download_profile_dump(record_id: int, admin = Depends(get_current_superuser)):
+    """Скачать cProfile-дамп конкретного профиля."""
+
+    data = profiler.get_dump(record_id)
+    if data is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Dump not found")
+    return Response(content=data, media_type="application/octet-stream",
+                    headers={"Content-Disposition": f'attachment; filename="profile-{record_id}.prof"'})
+
+
+@router.get("/slow-queries", **AdminDocs.slow_queries)
+async def get_slow_queries(limit: int = Query(100, ge=1, le=1000),
+                           admin = Depends(get_current_superuser)) -> SlowQueriesExport:
+    """Медленные запросы и их планы (этого воркера), новые сверху."""
+
+    queries = list(slow_queries.records)[-limit:][::-1]
+    plans = sorted(slow_queries.plans.values(), key=lambda p: p["captured_at"], reverse=True)
+    return SlowQueriesExport(threshold_ms=settings.SLOW_QUERY_THRESHOLD_MS, explain_enabled=settings.SLOW_QUERY_EXPLAIN,
+                             stats=slow_queries.stats(), queries=queries, plans=plans)
+
+
+@router.get("/metrics", **AdminDocs.metrics)
+async def get_metrics(admin = Depends(get_current_superuser)) -> MetricsOut:
+    """Счётчики оптимизаций (этого воркера)."""
+
+    hot = flight.hot_keys()
+    single = {name: SingleFlightStats(**s, hot_keys=[SingleFlightKey(key=k, coalesced=n) for k, n in hot.get(name, [])])
+              for name, s in flight.stats().items()}
+    return MetricsOut(single_flight=single, token_cache=token_cache.stats(), refresh_batching=issue_batcher_stats())
+
+
+def _profiling_state() -> ProfilingState:
+    config = ProfilingConfig(enabled=profiler.enabled, sample_rate=profiler.sample_rate, cprofile=profiler.cprofile)
+    return ProfilingState(config=config, records=list(profiler.records))
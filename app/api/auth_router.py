@@ -1,8 +1,10 @@
 from __future__ import annotations
 from typing import cast
+from uuid import uuid4
 from fastapi import APIRouter, Request, Response, HTTPException, status
 
 from app.core.db import get_pool
+from app.core.sharding import get_shards
 from app.core.config import settings
 from app.core.security import hash_password, verify_password, create_access_token, create_refresh_token, decode_token
 from app.models.auth import LoginRequest, RegisterRequest, RefreshRequest, AuthOk
@@ -11,9 +13,11 @@ from app.repositories.users import UsersRepo
 from app.repositories.refresh_tokens import RefreshTokensRepo
 from app.docs.auth_docs import AuthDocs
 from app.core.logger import get_logger
+from app.core.profiling import ProfiledRoute
+from app.core.events import record_event
 
 log = get_logger()
-router = APIRouter()
+router = APIRouter(route_class=ProfiledRoute)
 
 @router.post("/register", **AuthDocs.register)
 async def register(req: Request, body: RegisterRequest, resp: Response) -> AuthOk:
@@ -24,7 +28,8 @@ async def register(req: Request, body: RegisterRequest, resp: Response) -> AuthO
     - выдаём токены и ставим cookies"""
 
     pool = get_pool(req.app)
-    users = UsersRepo(pool)
+    shards = get_shards(req.app)
+    users = UsersRepo(pool, shards=shards)
 
     existing = await users.get_by_email(body.email)
     if existing:
@@ -36,11 +41,12 @@ async def register(req: Request, body: RegisterRequest, resp: Response) -> AuthO
 
     access = create_access_token(user_id=str(user["id"]), email=user["email"])
     refresh_token, jti, exp = create_refresh_token(user_id=str(user["id"]), email=user["email"])
-    await RefreshTokensRepo(pool).issue(user_id=user["id"], jti=jti, exp_ts=exp, 
+    await RefreshTokensRepo(pool, shards=shards).issue(user_id=user["id"], jti=jti, exp_ts=exp, 
                                         ip=_ip(req), user_agent=_ua(req))
 
     _set_auth_cookies(resp, access, refresh_token)
     log.info("register ok user_id=%s email=%s", str(user["id"]), user["email"])
+    record_event(req, "register_ok", user_id=user["id"], email=user["email"])
     return AuthOk(access_expires_in=settings.ACCESS_TOKEN_TTL,
                   refresh_expires_in=settings.REFRESH_TOKEN_TTL)
 
@@ -54,20 +60,23 @@ async def login(req: Request, body: LoginRequest, resp: Response) -> AuthOk:
     - записываем refresh jti в БД и ставим cookies"""
 
     pool = get_pool(req.app)
-    users = UsersRepo(pool)
+    shards = get_shards(req.app)
+    users = UsersRepo(pool, shards=shards)  # primary: с отстающей реплики после смены пароля работал бы старый
 
     user = await users.get_by_email(body.email)
     if not user or not verify_password(body.password, user["password_hash"]):
         log.warning("login failed email=%s", body.email)
+        record_event(req, "login_failed", user_id=user["id"] if user else None, email=body.email)
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
 
     access = create_access_token(user_id=str(user["id"]), email=user["email"])
     refresh_token, jti, exp = create_refresh_token(user_id=str(user["id"]), email=user["email"])
-    await RefreshTokensRepo(pool).issue(user_id=user["id"], jti=jti, exp_ts=exp, 
+    await RefreshTokensRepo(pool, shards=shards).issue(user_id=user["id"], jti=jti, exp_ts=exp, 
                                         ip=_ip(req), user_agent=_ua(req))
 
     _set_auth_cookies(resp, access, refresh_token)
     log.info("login ok user_id=%s email=%s", str(user["id"]), user["email"])
+    record_event(req, "login_ok", user_id=user["id"], email=user["email"])
     return AuthOk(access_expires_in=settings.ACCESS_TOKEN_TTL,
                   refresh_expires_in=settings.REFRESH_TOKEN_TTL)
 
@@ -78,10 +87,12 @@ async def refresh(req: Request, body: RefreshRequest, resp: Response) -> AuthOk:
     - берём refresh из тела или из cookie
     - проверяем валидность JWT и сверяем jti в БД
     - помечаем старый refresh как revoked
-    - выдаём новую пару токенов и записываем новый jti в БД"""
+    - выдаём новую пару токенов и записываем новый jti в БД
+    Все запросы идут в primary: проверка jti перед ротацией - это read-after-write."""
 
     pool = get_pool(req.app)
-    repo = RefreshTokensRepo(pool)
+    shards = get_shards(req.app)
+    repo = RefreshTokensRepo(pool, shards=shards)
 
     rt = body.refresh_token or req.cookies.get(settings.REFRESH_COOKIE_NAME)
     if not rt:
@@ -96,25 +107,27 @@ async def refresh(req: Request, body: RefreshRequest, resp: Response) -> AuthOk:
     jti = payload.get("jti")
     user_id = payload.get("sub")
 
-    db_token = await repo.get_by_jti(cast(str, jti))
+    db_token = await repo.get_by_jti(cast(str, jti), user_id=user_id)
     if not db_token or db_token["revoked_at"] is not None:
         log.warning("refresh invalid_or_revoked jti=%s", jti)
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Refresh token invalid or revoked")
 
-    await repo.revoke(jti=cast(str, jti), reason="rotated")
+    new_jti = uuid4()  # заранее: SSE-поток этой сессии по NOTIFY о ротации переключится на новый jti
+    await repo.revoke(jti=cast(str, jti), reason="rotated", user_id=user_id, replaced_by=new_jti)
 
-    users = UsersRepo(pool)
+    users = UsersRepo(pool, shards=shards)
     user = await users.get_by_id(user_id)
     if not user:
         log.warning("refresh user_missing user_id=%s", user_id)
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
 
     access = create_access_token(user_id=str(user["id"]), email=user["email"])
-    new_refresh, new_jti, exp = create_refresh_token(user_id=str(user["id"]), email=user["email"])
+    new_refresh, new_jti, exp = create_refresh_token(user_id=str(user["id"]), email=user["email"], jti=new_jti)
     await repo.issue(user_id=user["id"], jti=new_jti, exp_ts=exp, ip=_ip(req), user_agent=_ua(req))
 
     _set_auth_cookies(resp, access, new_refresh)
     log.info("refresh rotated user_id=%s old_jti=%s new_jti=%s", str(user["id"]), jti, str(new_jti))
+    record_event(req, "refresh_rotated", user_id=user["id"], email=user["email"])
     return AuthOk(access_expires_in=settings.ACCESS_TOKEN_TTL,
                   refresh_expires_in=settings.REFRESH_TOKEN_TTL)
 
@@ -127,7 +140,8 @@ async def logout(req: Request, body: RefreshRequest, resp: Response):
     - чистим cookies"""
 
     pool = get_pool(req.app)
-    repo = RefreshTokensRepo(pool)
+    shards = get_shards(req.app)
+    repo = RefreshTokensRepo(pool, shards=shards)
 
     rt = body.refresh_token or req.cookies.get(settings.REFRESH_COOKIE_NAME)
     if rt:
@@ -136,8 +150,9 @@ async def logout(req: Request, body: RefreshRequest, resp: Response):
             log.warning("logout wrong type")
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Wrong token type")
         jti = payload.get("jti")
-        await repo.revoke(jti=jti, reason="logout")
+        await repo.revoke(jti=jti, reason="logout", user_id=payload.get("sub"))
         log.info("logout revoked jti=%s", jti)
+        record_event(req, "logout", user_id=payload.get("sub"), email=payload.get("email"))
     else:
         log.info("logout without token (just clearing cookies)")
 
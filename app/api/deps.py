@@ -1,11 +1,13 @@
 from __future__ import annotations
 from fastapi import Depends, HTTPException, Request, status
 
-from app.core.db import get_pool
+from app.core.db import get_pool, get_read_pool
+from app.core.sharding import get_shards
 from app.core.security import decode_token
 from app.core.config import settings
 from app.repositories.users import UsersRepo
 from app.core.logger import get_logger
+from app.core.profiling import phase
 
 log = get_logger()
 
@@ -14,28 +16,46 @@ async def get_current_user(request: Request):
     Токен ищется так:
       1) В заголовке Authorization: Bearer <token>
       2) Если нет - в cookie (ACCESS_COOKIE_NAME)
-    Если что-то не так - кидаем 401."""
-
-    auth = request.headers.get("Authorization", "")
-    prefix = "Bearer "
-    token = auth[len(prefix):].strip() if auth.startswith(prefix) else None
-
-    if not token:
-        token = request.cookies.get(settings.ACCESS_COOKIE_NAME)
-
-    if not token:
-        log.warning("auth missing token")
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing token")
-
-    payload = decode_token(token)
-    if payload.get("type") != "access":
-        log.warning("auth wrong token type")
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Wrong token type")
-
-    user_id = payload.get("sub")
-    pool = get_pool(request.app)
-    user = await UsersRepo(pool).get_by_id(user_id)
-    if not user or not user["is_active"]:
-        log.warning("auth user not found or inactive user_id=%s", user_id)
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found or inactive")
+    Если что-то не так - кидаем 401.
+    Время пишется фазой get_current_user при профилировании."""
+
+    with phase("get_current_user"):
+        auth = request.headers.get("Authorization", "")
+        prefix = "Bearer "
+        token = auth[len(prefix):].strip() if auth.startswith(prefix) else None
+
+        if not token:
+            token = request.cookies.get(settings.ACCESS_COOKIE_NAME)
+
+        if not token:
+            log.warning("auth missing token")
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing token")
+
+        payload = decode_token(token)
+        if payload.get("type") != "access":
+            log.warning("auth wrong token type")
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Wrong token type")
+
+        user_id = payload.get("sub")
+        # Читаем с реплики: это самый частый запрос к users. Отставание допустимо - реплика старше
+        # REPLICA_MAX_LAG секунд из выборки исключается, так что деактивация/удаление видны с задержкой
+        # не больше REPLICA_MAX_LAG (access токен и так живёт дольше). Не нашли на реплике - перечитываем
+        # из primary: только что зарегистрированный пользователь мог ещё не доехать.
+        pool, read_pool = get_pool(request.app), get_read_pool(request.app)
+        shards = get_shards(request.app)
+        user = await UsersRepo(pool, read_pool=read_pool, shards=shards).get_by_id(user_id)
+        if user is None and read_pool is not pool and not shards:
+            user = await UsersRepo(pool).get_by_id(user_id)
+        if not user or not user["is_active"]:
+            log.warning("auth user not found or inactive user_id=%s", user_id)
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found or inactive")
+        return user
+
+
+async def get_current_superuser(user = Depends(get_current_user)):
+    """Как get_current_user, но пускает только суперпользователя (для /admin/*). Иначе 403."""
+
+    if not user["is_superuser"]:
+        log.warning("admin forbidden user_id=%s", str(user["id"]))
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Superuser required")
     return user
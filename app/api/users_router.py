@@ -1,17 +1,24 @@
 from __future__ import annotations
+import asyncio
+import json
 from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
 
 from app.api.deps import get_current_user
 from app.core.config import settings
 from app.core.logger import get_logger
-from app.core.security import verify_password, hash_password
+from app.core.profiling import ProfiledRoute
+from app.core.events import record_event
+from app.core.security import verify_password, hash_password, decode_token
+from app.core.revocations import hub
 from app.models.users import UserOut, UpdatePasswordRequest, DeleteByEmailRequest
 from app.repositories.users import UsersRepo
 from app.repositories.refresh_tokens import RefreshTokensRepo
 from app.core.db import get_pool
+from app.core.sharding import get_shards
 from app.docs.users_docs import UsersDocs
 
-router = APIRouter()
+router = APIRouter(route_class=ProfiledRoute)
 log = get_logger()
 
 
@@ -22,6 +29,40 @@ async def me(user = Depends(get_current_user)) -> UserOut:
                    is_superuser=user["is_superuser"], created_at=user["created_at"])
 
 
+@router.get("/me/events", **UsersDocs.events)
+async def events(request: Request, user = Depends(get_current_user)):
+    """SSE-поток событий отзыва сессий текущего пользователя (вместо опроса /users/me).
+    Одно событие `revoked` - и поток закрывается: клиенту пора разлогиниться.
+    Пока событий нет - раз в SSE_KEEPALIVE секунд шлём комментарий-keepalive."""
+
+    if not settings.SSE_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+
+    sub = hub.subscribe(user["id"], _session_jti(request))
+    if sub is None:
+        log.warning("events rejected user_id=%s stats=%s", str(user["id"]), hub.stats())
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Too many event streams")
+
+    async def stream():
+        try:
+            yield "retry: 5000\nevent: ready\ndata: {}\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(sub.queue.get(), timeout=settings.SSE_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: revoked\ndata: {json.dumps(event)}\n\n"
+                return
+        finally:
+            hub.unsubscribe(sub)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
 @router.patch("/me/password", **UsersDocs.update_password)
 async def update_password(request: Request, response: Response, body: UpdatePasswordRequest, user = Depends(get_current_user)):
     """Меняем пароль только для самого себя.
@@ -37,7 +78,8 @@ async def update_password(request: Request, response: Response, body: UpdatePass
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Email is not your own")
 
     pool = get_pool(request.app)
-    users_repo = UsersRepo(pool)
+    shards = get_shards(request.app)
+    users_repo = UsersRepo(pool, shards=shards)
     target = await users_repo.get_by_email(body.email)
     if not target:
         log.warning("update_password user_not_found email=%s", body.email)
@@ -53,11 +95,12 @@ async def update_password(request: Request, response: Response, body: UpdatePass
         log.warning("update_password failed_to_update user_id=%s", str(target["id"]))
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to update password")
 
-    await RefreshTokensRepo(pool).revoke_all_for_user(user_id=target["id"], reason="password_change")
+    await RefreshTokensRepo(pool, shards=shards).revoke_all_for_user(user_id=target["id"], reason="password_change")
 
     _clear_auth_cookies(response)
 
     log.info("update_password ok user_id=%s email=%s", str(target["id"]), target["email"])
+    record_event(request, "update_password_ok", user_id=target["id"], email=target["email"])
     return {"detail": "ok"}
 
 
@@ -66,9 +109,10 @@ async def delete_me(request: Request, response: Response, user = Depends(get_cur
     """Удаляем текущий аккаунт. Перед удалением отзываем все refresh-токены. После — чистим cookies."""
 
     pool = get_pool(request.app)
-    users_repo = UsersRepo(pool)
+    shards = get_shards(request.app)
+    users_repo = UsersRepo(pool, shards=shards)
 
-    await RefreshTokensRepo(pool).revoke_all_for_user(user_id=user["id"], reason="user_delete")
+    await RefreshTokensRepo(pool, shards=shards).revoke_all_for_user(user_id=user["id"], reason="user_delete")
 
     deleted = await users_repo.delete_by_email(user["email"])
     if not deleted:
@@ -77,6 +121,7 @@ async def delete_me(request: Request, response: Response, user = Depends(get_cur
 
     _clear_auth_cookies(response)
     log.info("delete ok email=%s", user["email"])
+    record_event(request, "delete_ok", user_id=user["id"], email=user["email"])
     return {"detail": "ok"}
 
 
@@ -86,3 +131,16 @@ def _clear_auth_cookies(resp: Response) -> None:
 
     for name in (settings.ACCESS_COOKIE_NAME, settings.REFRESH_COOKIE_NAME):
         resp.delete_cookie(name, domain=settings.COOKIE_DOMAIN, path=settings.COOKIE_PATH, samesite=settings.COOKIE_SAMESITE)
+
+
+def _session_jti(request: Request) -> str | None:
+    """jti refresh-токена этой сессии (из cookie), чтобы logout в другой вкладке/устройстве
+    не закрывал чужие потоки. Нет или протух - не страшно, получим только события по всему пользователю."""
+
+    rt = request.cookies.get(settings.REFRESH_COOKIE_NAME)
+    if not rt:
+        return None
+    try:
+        return decode_token(rt).get("jti")
+    except HTTPException:
+        return None
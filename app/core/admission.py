@@ -0,0 +1,69 @@
+from __future__ import annotations
+import asyncio
+from typing import Optional
+
+from app.core.config import settings
+
+
+class Gate:
+    """Лимит одновременных запросов для одного класса маршрутов.
+    Сверх лимита запрос ждёт в короткой очереди (не дольше timeout).
+    Если очередь полна или дедлайн вышел - acquire() возвращает False, и запрос надо отбить 503."""
+
+    def __init__(self, name: str, limit: int, queue_size: int, timeout: float):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._sem = asyncio.Semaphore(limit)
+
+    async def acquire(self) -> bool:
+        if self._sem.locked():
+            if self.waiting >= self.queue_size:
+                self.rejected += 1
+                return False
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._sem.acquire(), timeout=self.timeout)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                return False
+            finally:
+                self.waiting -= 1
+        else:
+            await self._sem.acquire()
+        self.active += 1
+        return True
+
+    def release(self) -> None:
+        self.active -= 1
+        self._sem.release()
+
+    def stats(self) -> dict[str, int]:
+        return {"limit": self.limit, "active": self.active, "waiting": self.waiting, "rejected": self.rejected}
+
+
+# Класс маршрута -> набор (method, path). Всё, что не попало сюда, не ограничиваем.
+ROUTE_CLASSES: dict[str, set[tuple[str, str]]] = {
+    "read": {("GET", "/users/me"), ("GET", "/health"), ("GET", "/ready")},
+    "token": {("POST", "/auth/refresh"), ("POST", "/auth/logout")},
+    "hash": {("POST", "/auth/login"), ("POST", "/auth/register"), ("PATCH", "/users/me/password")},
+}
+
+gates: dict[str, Gate] = {
+    "read": Gate("read", settings.ADMISSION_READ_LIMIT, settings.ADMISSION_QUEUE_SIZE, settings.ADMISSION_QUEUE_TIMEOUT),
+    "token": Gate("token", settings.ADMISSION_TOKEN_LIMIT, settings.ADMISSION_QUEUE_SIZE, settings.ADMISSION_QUEUE_TIMEOUT),
+    "hash": Gate("hash", settings.ADMISSION_HASH_LIMIT, settings.ADMISSION_QUEUE_SIZE, settings.ADMISSION_QUEUE_TIMEOUT),
+}
+
+
+def gate_for(method: str, path: str) -> Optional[Gate]:
+    """Возвращает Gate для маршрута или None, если маршрут не ограничивается."""
+
+    for name, routes in ROUTE_CLASSES.items():
+        if (method, path) in routes:
+            return gates[name]
+    return None
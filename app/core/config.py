@@ -6,6 +6,12 @@ from pydantic import BaseModel
 
 class Settings(BaseModel):
     DATABASE_URL: str = os.getenv("DATABASE_URL", "postgresql://postgres:postgres@db:5432/auth")
+    DATABASE_REPLICA_URLS: list[str] = [u.strip() for u in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if u.strip()]
+    DATABASE_REPLICA_SELECTION: str = os.getenv("DATABASE_REPLICA_SELECTION", "round_robin")  # round_robin | least_busy
+    DATABASE_SHARD_URLS: list[str] = [u.strip() for u in os.getenv("DATABASE_SHARD_URLS", "").split(",") if u.strip()]
+    SHARD_REBALANCE_IN_PROGRESS: bool = os.getenv("SHARD_REBALANCE_IN_PROGRESS", "false").lower() == "true"
+    REPLICA_MAX_LAG: float = float(os.getenv("REPLICA_MAX_LAG", "5"))                  # секунд
+    REPLICA_HEALTH_INTERVAL: float = float(os.getenv("REPLICA_HEALTH_INTERVAL", "5"))  # секунд
     JWT_SECRET: str = os.getenv("JWT_SECRET", "change-me")
     JWT_ALG: str = os.getenv("JWT_ALG", "HS256")
     ACCESS_TOKEN_TTL: int = int(os.getenv("ACCESS_TOKEN_TTL", "900"))        # 15 минут
@@ -21,6 +27,59 @@ class Settings(BaseModel):
     COOKIE_SAMESITE: str = os.getenv("COOKIE_SAMESITE", "lax")  
     COOKIE_PATH: str = os.getenv("COOKIE_PATH", "/")
 
+    TOKEN_CACHE_ENABLED: bool = os.getenv("TOKEN_CACHE_ENABLED", "false").lower() == "true"
+    TOKEN_CACHE_MAX_BYTES: int = int(os.getenv("TOKEN_CACHE_MAX_BYTES", str(4 * 1024 * 1024)))  # ~4 МБ
+
+    ADMISSION_ENABLED: bool = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+    ADMISSION_READ_LIMIT: int = int(os.getenv("ADMISSION_READ_LIMIT", "200"))     # /users/me, /health
+    ADMISSION_TOKEN_LIMIT: int = int(os.getenv("ADMISSION_TOKEN_LIMIT", "50"))    # /auth/refresh, /auth/logout
+    ADMISSION_HASH_LIMIT: int = int(os.getenv("ADMISSION_HASH_LIMIT", "8"))       # login/register/смена пароля (Argon2)
+    ADMISSION_QUEUE_SIZE: int = int(os.getenv("ADMISSION_QUEUE_SIZE", "32"))      # ожидающих на класс
+    ADMISSION_QUEUE_TIMEOUT: float = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "0.5"))  # секунд в очереди
+    ADMISSION_RETRY_AFTER: int = int(os.getenv("ADMISSION_RETRY_AFTER", "1"))     # секунд, заголовок Retry-After
+
+    REFRESH_BATCH_ENABLED: bool = os.getenv("REFRESH_BATCH_ENABLED", "false").lower() == "true"
+    REFRESH_BATCH_MAX_ROWS: int = int(os.getenv("REFRESH_BATCH_MAX_ROWS", "100"))
+    REFRESH_BATCH_MAX_DELAY_MS: float = float(os.getenv("REFRESH_BATCH_MAX_DELAY_MS", "5"))
+
+    AUTH_EVENTS_ENABLED: bool = os.getenv("AUTH_EVENTS_ENABLED", "true").lower() == "true"
+    AUTH_EVENTS_BUFFER_SIZE: int = int(os.getenv("AUTH_EVENTS_BUFFER_SIZE", "10000"))
+    AUTH_EVENTS_BATCH_SIZE: int = int(os.getenv("AUTH_EVENTS_BATCH_SIZE", "1000"))
+    AUTH_EVENTS_FLUSH_INTERVAL: float = float(os.getenv("AUTH_EVENTS_FLUSH_INTERVAL", "1"))  # секунд
+
+    PROFILING_ENABLED: bool = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+    PROFILING_SAMPLE_RATE: float = float(os.getenv("PROFILING_SAMPLE_RATE", "0.01"))
+    PROFILING_FORCE_SECRET: str = os.getenv("PROFILING_FORCE_SECRET", "")   # X-Profile: <секрет>; пусто - заголовок игнорируется
+    PROFILING_MAX_RECORDS: int = int(os.getenv("PROFILING_MAX_RECORDS", "500"))
+    PROFILING_MAX_DUMPS: int = int(os.getenv("PROFILING_MAX_DUMPS", "10"))
+
+    COLD_START_MODE: bool = os.getenv("COLD_START_MODE", "false").lower() == "true"
+    COLD_START_RETRY_INTERVAL: float = float(os.getenv("COLD_START_RETRY_INTERVAL", "2"))  # секунд
+
+    SSE_ENABLED: bool = os.getenv("SSE_ENABLED", "true").lower() == "true"
+    SSE_MAX_CONNECTIONS: int = int(os.getenv("SSE_MAX_CONNECTIONS", "5000"))   # на воркер
+    SSE_MAX_PER_USER: int = int(os.getenv("SSE_MAX_PER_USER", "10"))
+    SSE_QUEUE_SIZE: int = int(os.getenv("SSE_QUEUE_SIZE", "4"))
+    SSE_KEEPALIVE: float = float(os.getenv("SSE_KEEPALIVE", "15"))              # секунд
+    SSE_RECONNECT_INTERVAL: float = float(os.getenv("SSE_RECONNECT_INTERVAL", "2"))
+
+    SLOW_QUERY_ENABLED: bool = os.getenv("SLOW_QUERY_ENABLED", "true").lower() == "true"
+    SLOW_QUERY_THRESHOLD_MS: float = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "100"))
+    SLOW_QUERY_MAX_RECORDS: int = int(os.getenv("SLOW_QUERY_MAX_RECORDS", "500"))
+    SLOW_QUERY_EXPLAIN: bool = os.getenv("SLOW_QUERY_EXPLAIN", "false").lower() == "true"
+    SLOW_QUERY_EXPLAIN_INTERVAL: float = float(os.getenv("SLOW_QUERY_EXPLAIN_INTERVAL", "300"))  # сек на один запрос
+    SLOW_QUERY_MAX_PLANS: int = int(os.getenv("SLOW_QUERY_MAX_PLANS", "100"))
+
+    TRACING_ENABLED: bool = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+    TRACING_SAMPLE_RATE: float = float(os.getenv("TRACING_SAMPLE_RATE", "0.1"))   # без входящего traceparent
+    TRACING_BUFFER_SIZE: int = int(os.getenv("TRACING_BUFFER_SIZE", "20000"))     # span'ов в памяти
+    TRACING_EXPORT_DIR: str = os.getenv("TRACING_EXPORT_DIR", "traces")
+    TRACING_EXPORT_INTERVAL: float = float(os.getenv("TRACING_EXPORT_INTERVAL", "5"))
+    TRACING_MAX_FILES: int = int(os.getenv("TRACING_MAX_FILES", "100"))           # на воркер
+    TRACING_SERVICE_NAME: str = os.getenv("TRACING_SERVICE_NAME", "auth-service")
+
+    SINGLE_FLIGHT_ENABLED: bool = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+
     def access_delta(self) -> timedelta:
         return timedelta(seconds=self.ACCESS_TOKEN_TTL)
 
@@ -1,35 +1,181 @@
 from __future__ import annotations
+import asyncio
 import pathlib
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import AsyncIterator
 import asyncpg
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, status
 from app.core.config import settings
+from app.core.logger import get_logger
+from app.core.profiling import phase
+from app.core.sharding import create_shards, get_shards
+from app.core.slow_queries import slow_queries
+from app.core.tracing import current_span, trace_query
 
 POOL_KEY = "db_pool"
+REPLICAS_KEY = "db_replicas"
+# Отставание реплики в секундах. Если всё полученное WAL уже применено - отставания нет, даже когда
+# на primary давно не было записей (иначе now() - pg_last_xact_replay_timestamp() растёт на простое).
+REPLICA_LAG_SQL = """SELECT CASE
+    WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END::float8"""
+
+log = get_logger()
+
+
+class ReplicaSet:
+    """Пулы read-реплик + фоновая проверка здоровья.
+    Реплика считается живой, если отвечает на запрос и отстаёт не больше REPLICA_MAX_LAG секунд.
+    Если живых реплик нет - pick() возвращает None и чтение идёт в primary."""
+
+    def __init__(self, pools: list[asyncpg.Pool]):
+        self.pools = pools
+        self.healthy = [False] * len(pools)
+        self._rr = 0
+        self._task: asyncio.Task | None = None
+
+    def pick(self) -> asyncpg.Pool | None:
+        """Выбирает реплику: round_robin или least_busy (меньше всего занятых соединений)."""
+
+        candidates = [p for p, ok in zip(self.pools, self.healthy) if ok]
+        if not candidates:
+            return None
+        if settings.DATABASE_REPLICA_SELECTION == "least_busy":
+            return min(candidates, key=lambda p: p.get_size() - p.get_idle_size())
+        self._rr = (self._rr + 1) % len(candidates)
+        return candidates[self._rr]
+
+    async def check(self) -> None:
+        """Один проход health check по всем репликам."""
+
+        for i, pool in enumerate(self.pools):
+            try:
+                async with pool.acquire(timeout=2) as conn:
+                    lag = await conn.fetchval(REPLICA_LAG_SQL)
+                ok = lag <= settings.REPLICA_MAX_LAG
+                if not ok:
+                    log.warning("replica lagging idx=%s lag=%.1fs", i, lag)
+            except Exception as e:
+                ok = False
+                log.warning("replica down idx=%s err=%s", i, e)
+            if ok != self.healthy[i]:
+                log.info("replica state changed idx=%s healthy=%s", i, ok)
+            self.healthy[i] = ok
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(settings.REPLICA_HEALTH_INTERVAL)
+            await self.check()
+
+    async def start(self) -> None:
+        await self.check()
+        self._task = asyncio.create_task(self._loop())
+
+    async def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+        for pool in self.pools:
+            await pool.close()
+
 
 async def create_pool(app: FastAPI) -> None:
-    """Создаем пул подключений"""
-    pool = await asyncpg.create_pool(dsn=settings.DATABASE_URL, min_size=1, max_size=10)
-    app.state.__setattr__(POOL_KEY, pool)
+    """Создаем пул подключений (и пулы реплик/шардов, если заданы DATABASE_REPLICA_URLS / DATABASE_SHARD_URLS).
+    Идемпотентно: при холодном старте упавший шаг повторяется целиком, поэтому уже созданные пулы
+    переиспользуем, а не создаём заново (иначе каждая попытка оставляла бы открытые соединения)."""
+
+    pool = getattr(app.state, POOL_KEY, None)
+    if pool is None:
+        pool = await asyncpg.create_pool(dsn=settings.DATABASE_URL, min_size=1, max_size=10)
+        app.state.__setattr__(POOL_KEY, pool)
+    if get_shards(app) is None:
+        await create_shards(app, directory=pool)
+
+    if settings.DATABASE_REPLICA_URLS and getattr(app.state, REPLICAS_KEY, None) is None:
+        # min_size=0: недоступная реплика не должна ронять старт сервиса
+        pools = [await asyncpg.create_pool(dsn=dsn, min_size=0, max_size=10) for dsn in settings.DATABASE_REPLICA_URLS]
+        replicas = ReplicaSet(pools)
+        await replicas.start()
+        app.state.__setattr__(REPLICAS_KEY, replicas)
 
 
 def get_pool(app: FastAPI) -> asyncpg.pool.Pool:
-    """Получаем пул подключений"""
-    return getattr(app.state, POOL_KEY)
+    """Получаем пул подключений. Пока пул не создан (холодный старт) - 503."""
+    pool = getattr(app.state, POOL_KEY, None)
+    if pool is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Service is warming up")
+    return pool
+
+
+def get_read_pool(app: FastAPI) -> asyncpg.pool.Pool:
+    """Пул для read-only запросов: живая реплика, а если их нет - primary.
+    Данные могут отставать до REPLICA_MAX_LAG секунд. Не использовать для read-after-write
+    (проверка refresh при ротации) и для проверки пароля при логине; get_current_user читает отсюда,
+    а при промахе перечитывает из primary."""
+
+    replicas: ReplicaSet | None = getattr(app.state, REPLICAS_KEY, None)
+    replica = replicas.pick() if replicas else None
+    return replica or get_pool(app)
+
+
+@asynccontextmanager
+async def acquire(pool: asyncpg.Pool) -> AsyncIterator[asyncpg.Connection]:
+    """pool.acquire() с учётом ожидания свободного соединения (фаза/span db.acquire).
+    На время работы вешаем query logger: замер каждого SQL для журнала медленных запросов
+    и span на каждый SQL, если запрос трассируется.
+    Репозитории берут соединения только через него."""
+
+    with phase("db.acquire"):
+        conn = await pool.acquire()
+    try:
+        if settings.SLOW_QUERY_ENABLED or current_span() is not None:
+            with conn.query_logger(partial(_on_query, pool)):
+                yield conn
+        else:
+            yield conn
+    finally:
+        await pool.release(conn)
+
+
+def _on_query(pool: asyncpg.Pool, record) -> None:
+    if current_span() is not None:
+        trace_query(record)
+    if settings.SLOW_QUERY_ENABLED:
+        slow_queries.observe(pool, record)
 
 
 async def close_pool(app: FastAPI) -> None:
     """Закрываем пул подключений"""
-    pool = get_pool(app)
-    await pool.close()
+    replicas: ReplicaSet | None = getattr(app.state, REPLICAS_KEY, None)
+    if replicas:
+        await replicas.close()
+    shards = get_shards(app)
+    if shards:
+        await shards.close()
+    pool = getattr(app.state, POOL_KEY, None)
+    if pool is not None:
+        await pool.close()
 
 
 async def run_migrations(app: FastAPI) -> None:
     """Простая система миграций:
     - создаём служебную таблицу schema_migrations (если её нет)
     - применяем все .sql файлы из папки migrations по алфавиту
-    - записываем имя применённого файла, чтобы не накатывать его снова"""
+    - записываем имя применённого файла, чтобы не накатывать его снова
+    При шардировании миграции накатываются на основную БД и на каждый шард,
+    после чего проверяем, что существующие пользователи перенесены в директорию (см. ShardRouter.check_directory)."""
+
+    shards = get_shards(app)
+    pools = [get_pool(app)] + (shards.pools if shards else [])
+    for pool in pools:
+        await _migrate(pool)
+    if shards:
+        await shards.check_directory()
+
 
-    pool = get_pool(app)
+async def _migrate(pool: asyncpg.Pool) -> None:
+    """Накатываем миграции на одну БД"""
     migrations_dir = pathlib.Path(__file__).resolve().parents[1] / "migrations"
     files = sorted([p for p in migrations_dir.glob("*.sql")])
 
@@ -6,6 +6,8 @@ import time
 from functools import wraps
 from typing import Any, Callable
 
+from app.core.profiling import phase
+
 _LOGGER_NAME = "auth"
 
 PRIVATE_KEYWORDS = {
@@ -13,6 +15,7 @@ PRIVATE_KEYWORDS = {
     "client_id", "client_secret", "grant_type", "token_type",
     "expires_in", "access_token", "refresh_token", "token",
     "password", "pma_username", "pma_password",
+    "$argon2",  # хеши паролей в параметрах SQL
 }
 
 
@@ -70,8 +73,9 @@ def simple_logger(func: Callable) -> Callable:
         if logger is None:
             logger = get_logger()
 
-        masked_args = _mask_private_data(args)
-        masked_kwargs = _mask_private_data(kwargs)
+        with phase("logger.mask"):
+            masked_args = _mask_private_data(args)
+            masked_kwargs = _mask_private_data(kwargs)
 
         start = time.perf_counter()
         logger.debug(f"Запуск {func.__name__}() args={masked_args}, kwargs={masked_kwargs}")
@@ -92,8 +96,9 @@ def simple_logger(func: Callable) -> Callable:
         if logger is None:
             logger = get_logger()
 
-        masked_args = _mask_private_data(args)
-        masked_kwargs = _mask_private_data(kwargs)
+        with phase("logger.mask"):
+            masked_args = _mask_private_data(args)
+            masked_kwargs = _mask_private_data(kwargs)
 
         start = time.perf_counter()
         logger.debug(f"Запуск {func.__name__}() args={masked_args}, kwargs={masked_kwargs}")
@@ -0,0 +1,168 @@
+from __future__ import annotations
+import cProfile
+import hmac
+import inspect
+import itertools
+import marshal
+import random
+import time
+from collections import deque
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Callable, Optional
+
+from fastapi.routing import APIRoute
+
+from app.core.config import settings
+from app.core.tracing import current_span, span
+
+
+class Profile:
+    """Тайминги фаз одного запроса (мс). Живёт в contextvar, пока запрос выполняется."""
+
+    __slots__ = ("phases", "start")
+
+    def __init__(self) -> None:
+        self.phases: list[tuple[str, float]] = []
+        self.start = time.perf_counter()
+
+    def add(self, name: str, ms: float) -> None:
+        self.phases.append((name, round(ms, 3)))
+
+
+_current: ContextVar[Optional[Profile]] = ContextVar("profile", default=None)
+
+
+class phase:
+    """Контекстный менеджер: `with phase("db.acquire"): ...`.
+    Пишет фазу в профиль и дочерний span в трассу (app.core.tracing), если они активны.
+    Если запрос не профилируется и не трассируется - ничего не делает (две проверки contextvar)."""
+
+    __slots__ = ("name", "prof", "start", "span")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.prof = _current.get()
+        self.span = span(name) if current_span() is not None else None
+
+    def __enter__(self) -> "phase":
+        if self.span is not None:
+            self.span.__enter__()
+        if self.prof is not None:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self.prof is not None:
+            self.prof.add(self.name, (time.perf_counter() - self.start) * 1000)
+        if self.span is not None:
+            self.span.__exit__(*exc)
+
+
+def profiled(func: Callable) -> Callable:
+    """Декоратор: время вызова функции пишется фазой (и span'ом) с именем Class.method.
+    Работает и для sync, и для async (как simple_logger)."""
+
+    name = func.__qualname__
+
+    if inspect.iscoroutinefunction(func):
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            if _current.get() is None and current_span() is None:
+                return await func(*args, **kwargs)
+            with phase(name):
+                return await func(*args, **kwargs)
+        return async_wrapper
+
+    @wraps(func)
+    def sync_wrapper(*args, **kwargs):
+        if _current.get() is None and current_span() is None:
+            return func(*args, **kwargs)
+        with phase(name):
+            return func(*args, **kwargs)
+    return sync_wrapper
+
+
+class ProfiledRoute(APIRoute):
+    """APIRoute, который пишет фазу "route": разбор тела + зависимости + сам хендлер + сериализация.
+    Всё, что снаружи (total - route), считаем временем middleware."""
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def profiled_handler(request):
+            if _current.get() is None and current_span() is None:
+                return await handler(request)
+            with phase("route"):
+                return await handler(request)
+        return profiled_handler
+
+
+class Profiler:
+    """Режим профилирования: включается суперпользователем через /admin/profiling.
+    Пока выключен - запросы не трогаем вообще. Когда включён - профилируем долю sample_rate
+    (или конкретный запрос с заголовком X-Profile: <PROFILING_FORCE_SECRET>). Результаты - в ограниченных буферах в памяти."""
+
+    def __init__(self) -> None:
+        self.enabled = settings.PROFILING_ENABLED
+        self.sample_rate = settings.PROFILING_SAMPLE_RATE
+        self.cprofile = False
+        self.records: deque[dict[str, Any]] = deque(maxlen=settings.PROFILING_MAX_RECORDS)
+        self.dumps: deque[tuple[int, str, bytes]] = deque(maxlen=settings.PROFILING_MAX_DUMPS)
+        self._ids = itertools.count(1)
+        self._cprofile_busy = False
+
+    def should_profile(self, header: Optional[str]) -> bool:
+        """Форсировать профиль заголовком можно только зная секрет: иначе любой анонимный клиент
+        мог бы включать дорогой cProfile на своих запросах."""
+
+        forced = bool(header and settings.PROFILING_FORCE_SECRET
+                      and hmac.compare_digest(header.encode(), settings.PROFILING_FORCE_SECRET.encode()))
+        return self.enabled and (forced or random.random() < self.sample_rate)
+
+    def begin(self) -> tuple[Profile, Any, Optional[cProfile.Profile]]:
+        prof = Profile()
+        token = _current.set(prof)
+        cp = None
+        # cProfile глобален для потока - одновременно снимаем только один дамп, и в него попадает
+        # всё, что event loop делал за время запроса (в т.ч. чужие корутины), а не только этот запрос
+        if self.cprofile and not self._cprofile_busy:
+            self._cprofile_busy = True
+            cp = cProfile.Profile()
+            cp.enable()
+        return prof, token, cp
+
+    def end(self, prof: Profile, token: Any, cp: Optional[cProfile.Profile],
+            request_id: str, method: str, path: str, status: int) -> dict[str, Any]:
+        _current.reset(token)
+        record_id = next(self._ids)
+        if cp is not None:
+            cp.disable()
+            cp.create_stats()
+            self.dumps.append((record_id, path, marshal.dumps(cp.stats)))
+            self._cprofile_busy = False
+
+        total_ms = (time.perf_counter() - prof.start) * 1000
+        route_ms = sum(ms for n, ms in prof.phases if n == "route")
+        prof.add("middleware", total_ms - route_ms)
+        record = {
+            "id": record_id,
+            "request_id": request_id,
+            "method": method,
+            "path": path,
+            "status": status,
+            "total_ms": round(total_ms, 3),
+            "phases": [{"name": n, "ms": ms} for n, ms in prof.phases],
+            "has_dump": cp is not None,
+        }
+        self.records.append(record)
+        return record
+
+    def get_dump(self, record_id: int) -> Optional[bytes]:
+        for rid, _, data in self.dumps:
+            if rid == record_id:
+                return data
+        return None
+
+
+profiler = Profiler()
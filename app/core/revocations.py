@@ -0,0 +1,168 @@
+from __future__ import annotations
+import asyncio
+import json
+from typing import Any, Optional
+from uuid import UUID
+
+import asyncpg
+from fastapi import FastAPI
+
+from app.core.config import settings
+from app.core.logger import get_logger
+
+CHANNEL = "auth_revocations"
+LISTENER_KEY = "revocation_listener"
+ROTATED = "rotated"
+
+log = get_logger()
+
+
+async def notify_revocation(conn: asyncpg.Connection, kind: str, user_id: Any,
+                            jti: Any = None, reason: str | None = None, replaced_by: Any = None) -> None:
+    """NOTIFY о том, что сессии пользователя отозваны. Вызывается репозиториями на том же соединении.
+    kind: session_revoked (один refresh по jti) | all_sessions_revoked | user_deleted.
+    Ротация refresh (reason="rotated") - не отзыв сессии: вместо session_revoked шлём session_rotated
+    со старым и новым jti (replaced_by), чтобы потоки этой сессии дальше слушали новый jti.
+    Без replaced_by про ротацию ничего не шлём."""
+
+    if not settings.SSE_ENABLED:
+        return
+    if kind == "session_revoked" and reason == ROTATED:
+        if replaced_by is None:
+            return
+        kind = "session_rotated"
+    payload = json.dumps({"kind": kind, "user_id": str(user_id), "jti": str(jti) if jti else None, "reason": reason,
+                          "replaced_by": str(replaced_by) if replaced_by else None})
+    await conn.execute("SELECT pg_notify($1, $2)", CHANNEL, payload)
+
+
+class Subscriber:
+    """Одно открытое SSE-соединение. jti - refresh этой сессии (из cookie), если известен;
+    при ротации refresh заменяется на новый (см. session_rotated)."""
+
+    __slots__ = ("user_id", "jti", "queue")
+
+    def __init__(self, user_id: str, jti: Optional[str], queue_size: int):
+        self.user_id = user_id
+        self.jti = jti
+        self.queue: asyncio.Queue[dict[str, Any]] = asyncio.Queue(maxsize=queue_size)
+
+
+class RevocationHub:
+    """Локальные (на воркер) подписчики на события отзыва.
+    Память ограничена: не больше max_connections соединений на воркер, max_per_user на пользователя,
+    и короткая очередь на соединение (клиенту после первого события всё равно надо разлогиниться)."""
+
+    def __init__(self, max_connections: int, max_per_user: int, queue_size: int):
+        self.max_connections = max_connections
+        self.max_per_user = max_per_user
+        self.queue_size = queue_size
+        self._by_user: dict[str, set[Subscriber]] = {}
+        self.connections = 0
+        self.rejected = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.rotated = 0
+
+    def subscribe(self, user_id: str | UUID, jti: Optional[str]) -> Optional[Subscriber]:
+        """None - если упёрлись в лимиты (клиенту отдаём 503)."""
+
+        subs = self._by_user.setdefault(str(user_id), set())
+        if self.connections >= self.max_connections or len(subs) >= self.max_per_user:
+            self.rejected += 1
+            if not subs:
+                self._by_user.pop(str(user_id), None)
+            return None
+        sub = Subscriber(str(user_id), jti, self.queue_size)
+        subs.add(sub)
+        self.connections += 1
+        return sub
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        subs = self._by_user.get(sub.user_id)
+        if subs and sub in subs:
+            subs.discard(sub)
+            self.connections -= 1
+            if not subs:
+                del self._by_user[sub.user_id]
+
+    def dispatch(self, event: dict[str, Any]) -> None:
+        """Событие по одному jti - только в сессию с этим jti, остальные - во все сессии пользователя.
+        session_rotated клиенту не отправляется: только переводит сессию со старого jti на новый."""
+
+        kind = event.get("kind")
+        for sub in list(self._by_user.get(event.get("user_id") or "", ())):
+            if kind in ("session_revoked", "session_rotated") and sub.jti != event.get("jti"):
+                continue
+            if kind == "session_rotated":
+                sub.jti = event.get("replaced_by")
+                self.rotated += 1
+                continue
+            try:
+                sub.queue.put_nowait(event)
+                self.delivered += 1
+            except asyncio.QueueFull:
+                self.dropped += 1
+
+    def stats(self) -> dict[str, int]:
+        return {"connections": self.connections, "users": len(self._by_user), "rejected": self.rejected,
+                "delivered": self.delivered, "dropped": self.dropped, "rotated": self.rotated}
+
+
+hub = RevocationHub(settings.SSE_MAX_CONNECTIONS, settings.SSE_MAX_PER_USER, settings.SSE_QUEUE_SIZE)
+
+
+class RevocationListener:
+    """LISTEN auth_revocations на отдельном соединении к каждой БД (основная + шарды).
+    Так события доходят до всех воркеров: NOTIFY делает тот воркер, который отозвал токены.
+    При обрыве соединения переподключаемся."""
+
+    def __init__(self, dsns: list[str]):
+        self.dsns = dsns
+        self._tasks: list[asyncio.Task] = []
+
+    def _on_notify(self, _conn, _pid, _channel, payload: str) -> None:
+        try:
+            hub.dispatch(json.loads(payload))
+        except ValueError:
+            log.warning("revocation bad payload=%s", payload[:200])
+
+    async def _listen_forever(self, dsn: str) -> None:
+        while True:
+            conn = None
+            try:
+                conn = await asyncpg.connect(dsn=dsn)
+                closed = asyncio.Event()
+                conn.add_termination_listener(lambda _c: closed.set())
+                await conn.add_listener(CHANNEL, self._on_notify)
+                await closed.wait()
+                log.warning("revocation listener connection lost, reconnecting")
+            except asyncio.CancelledError:
+                if conn is not None and not conn.is_closed():
+                    await conn.close()
+                raise
+            except Exception as e:
+                log.warning("revocation listener error=%s, reconnecting", e)
+            await asyncio.sleep(settings.SSE_RECONNECT_INTERVAL)
+
+    def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._listen_forever(dsn)) for dsn in self.dsns]
+
+    def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+
+
+async def start_revocation_listener(app: FastAPI) -> None:
+    """Запускаем LISTEN (если включены SSE-события)"""
+    if settings.SSE_ENABLED:
+        listener = RevocationListener([settings.DATABASE_URL] + settings.DATABASE_SHARD_URLS)
+        listener.start()
+        app.state.__setattr__(LISTENER_KEY, listener)
+
+
+async def stop_revocation_listener(app: FastAPI) -> None:
+    """Останавливаем LISTEN"""
+    listener: RevocationListener | None = getattr(app.state, LISTENER_KEY, None)
+    if listener:
+        listener.stop()
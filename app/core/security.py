@@ -1,29 +1,52 @@
 from __future__ import annotations
+import hashlib
+import time
+from collections import OrderedDict
 from datetime import datetime, timezone
 from typing import Any, Optional
 from uuid import uuid4, UUID
 
-import jwt
 from fastapi import HTTPException, status
-from passlib.hash import argon2
 
 from app.core.config import settings
 from app.core.logger import get_logger
+from app.core.profiling import profiled
 
 log = get_logger()
 
+
+def _jwt():
+    """PyJWT импортируем при первом использовании, а не на старте воркера (холодный старт быстрее)."""
+    import jwt
+    return jwt
+
+
+def _argon2():
+    """passlib/argon2 - тоже лениво, это самый тяжёлый импорт из наших зависимостей."""
+    from passlib.hash import argon2
+    return argon2
+
+
+def warm_up() -> None:
+    """Прогреваем ленивые импорты заранее (фоном на старте), чтобы первый логин не платил за них."""
+    _jwt()
+    _argon2()
+
+
+@profiled
 def hash_password(password: str) -> str:
     """Делаем хеш пароля"""
 
-    hashed = argon2.hash(password)
+    hashed = _argon2().hash(password)
     log.debug("password hashed")
     return hashed
 
 
+@profiled
 def verify_password(password: str, password_hash: str) -> bool:
     """Проверяем, что пароль подходит к хешу (true/false)."""
     
-    ok = argon2.verify(password, password_hash)
+    ok = _argon2().verify(password, password_hash)
     log.debug("password verify ok=%s", ok)
     return ok
 
@@ -34,6 +57,7 @@ def _now() -> datetime:
     return datetime.now(timezone.utc)
 
 
+@profiled
 def create_access_token(user_id: str, email: str) -> str:
     """Создаем короткоживущий токен доступа"""
     iat = int(_now().timestamp())
@@ -41,11 +65,12 @@ def create_access_token(user_id: str, email: str) -> str:
     jti = str(uuid4())
     payload = {"sub": user_id, "email": email, "type": "access",
                "iat": iat, "exp": exp, "jti": jti}
-    token = jwt.encode(payload, settings.JWT_SECRET, algorithm=settings.JWT_ALG)
+    token = _jwt().encode(payload, settings.JWT_SECRET, algorithm=settings.JWT_ALG)
     log.debug("access created user_id=%s jti=%s", user_id, jti)
     return token
 
 
+@profiled
 def create_refresh_token(user_id: str, email: str, jti: Optional[UUID] = None) -> tuple[str, UUID, int]:
     """Создаем длинноживущий рефреш токен
     Возвращает кортеж: (сам токен, jti, exp_timestamp)
@@ -57,19 +82,94 @@ def create_refresh_token(user_id: str, email: str, jti: Optional[UUID] = None) -
     jti_val = jti or uuid4()
     payload = {"sub": user_id, "email": email, "type": "refresh",
                "iat": iat, "exp": exp, "jti": str(jti_val)}
-    token = jwt.encode(payload, settings.JWT_SECRET, algorithm=settings.JWT_ALG)
+    token = _jwt().encode(payload, settings.JWT_SECRET, algorithm=settings.JWT_ALG)
     log.debug("refresh created user_id=%s jti=%s", user_id, str(jti_val))
     return token, jti_val, exp
 
 
+class TokenCache:
+    """LRU-кеш уже проверенных JWT payload'ов.
+    Ключ - sha256 от токена (сам токен не храним), запись живёт до exp токена.
+    Размер ограничен примерной оценкой памяти (max_bytes), при переполнении вытесняем самые старые."""
+
+    _ENTRY_OVERHEAD = 256  # dict, ключ, кортеж и т.п. - грубая оценка на запись
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0  # вытеснены по размеру (LRU)
+        self.expired = 0    # выброшены при чтении, потому что токен истёк
+        self._data: OrderedDict[bytes, tuple[int, dict[str, Any], int]] = OrderedDict()
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[dict[str, Any]]:
+        key = self._key(token)
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        exp, payload, _ = entry
+        if exp <= time.time():
+            self._pop(key)
+            self.expired += 1
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return dict(payload)
+
+    def put(self, token: str, payload: dict[str, Any]) -> None:
+        exp = payload.get("exp")
+        if not isinstance(exp, int):
+            return
+        key = self._key(token)
+        cost = len(key) + len(repr(payload)) + self._ENTRY_OVERHEAD
+        if cost > self.max_bytes:
+            return
+        self._pop(key)
+        self._data[key] = (exp, dict(payload), cost)
+        self.size += cost
+        while self.size > self.max_bytes:
+            self._pop(next(iter(self._data)))
+            self.evictions += 1
+
+    def _pop(self, key: bytes) -> None:
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.size -= entry[2]
+
+    def stats(self) -> dict[str, int]:
+        return {"enabled": int(settings.TOKEN_CACHE_ENABLED), "entries": len(self._data), "bytes": self.size,
+                "max_bytes": self.max_bytes, "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "expired": self.expired}
+
+
+token_cache = TokenCache(settings.TOKEN_CACHE_MAX_BYTES)
+
+
+@profiled
 def decode_token(token: str) -> dict[str, Any]:
     """Декодируем JWT и проверяет его подпись/срок.
-    Если просрочен или сломан — кидает 401."""
+    Если просрочен или сломан — кидает 401.
+    При TOKEN_CACHE_ENABLED повторные вызовы с тем же токеном берут payload из кеша (до exp)."""
+
+    if settings.TOKEN_CACHE_ENABLED:
+        cached = token_cache.get(token)
+        if cached is not None:
+            return cached
 
+    jwt = _jwt()
     try:
         data = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALG])
         t = data.get("type")
         log.debug("token decoded ok type=%s", t)
+        if settings.TOKEN_CACHE_ENABLED:
+            token_cache.put(token, data)
         return data
     except jwt.ExpiredSignatureError:
         log.warning("token expired")
@@ -0,0 +1,113 @@
+from __future__ import annotations
+import bisect
+import hashlib
+from typing import Any, Optional
+from uuid import UUID
+
+import asyncpg
+from fastapi import FastAPI
+
+from app.core.config import settings
+
+SHARDS_KEY = "db_shards"
+VNODES = 128  # виртуальных узлов на шард в кольце
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """Консистентное хеширование user_id -> номер шарда.
+    Шард i всегда представлен одними и теми же точками кольца, поэтому при добавлении
+    шарда в конец списка переезжает только ~1/N пользователей."""
+
+    def __init__(self, shard_count: int, vnodes: int = VNODES):
+        points = sorted((_hash(f"shard-{i}#{v}"), i) for i in range(shard_count) for v in range(vnodes))
+        self._keys = [h for h, _ in points]
+        self._shards = [i for _, i in points]
+
+    def shard_for(self, user_id: str | UUID) -> int:
+        idx = bisect.bisect(self._keys, _hash(str(user_id))) % len(self._keys)
+        return self._shards[idx]
+
+
+class ShardRouter:
+    """Роутинг users/refresh_tokens по шардам.
+    - шард пользователя = консистентный хеш user_id (HashRing)
+    - email -> (user_id, shard) хранится в таблице user_directory основной БД (DATABASE_URL),
+      чтобы get_by_email при логине был одним поиском, а не обходом всех шардов
+    - пока идёт ребалансировка (SHARD_REBALANCE_IN_PROGRESS), шард пользователя берём из директории"""
+
+    def __init__(self, pools: list[asyncpg.Pool], directory: asyncpg.Pool):
+        self.pools = pools
+        self.directory = directory
+        self.ring = HashRing(len(pools))
+
+    def home_shard(self, user_id: str | UUID) -> int:
+        """Шард, где пользователь должен жить по кольцу (для новых пользователей)."""
+        return self.ring.shard_for(user_id)
+
+    async def pool_for_user(self, user_id: str | UUID) -> asyncpg.Pool:
+        """Пул шарда пользователя. В обычном режиме - без запросов, по кольцу."""
+
+        if settings.SHARD_REBALANCE_IN_PROGRESS:
+            async with self.directory.acquire() as conn:
+                shard = await conn.fetchval("SELECT shard FROM user_directory WHERE user_id = $1", user_id)
+            if shard is not None:
+                return self.pools[shard]
+        return self.pools[self.home_shard(user_id)]
+
+    async def lookup_email(self, email: str) -> Optional[dict[str, Any]]:
+        """{"user_id", "shard"} по email или None."""
+
+        async with self.directory.acquire() as conn:
+            row = await conn.fetchrow("SELECT user_id, shard FROM user_directory WHERE email = $1", email)
+            return dict(row) if row else None
+
+    async def register_email(self, email: str, user_id: UUID, shard: int) -> None:
+        """Резервирует email. Уникальность email между шардами обеспечивает PK директории
+        (кидает asyncpg.UniqueViolationError, как и INSERT в users)."""
+
+        async with self.directory.acquire() as conn:
+            await conn.execute("INSERT INTO user_directory (email, user_id, shard) VALUES ($1, $2, $3)",
+                               email, user_id, shard)
+
+    async def forget_email(self, email: str) -> None:
+        async with self.directory.acquire() as conn:
+            await conn.execute("DELETE FROM user_directory WHERE email = $1", email)
+
+    async def check_directory(self) -> None:
+        """Не даём включить шардирование поверх живой нешардированной БД: директория пуста, а в users основной БД
+        есть пользователи - значит их не перенесли, и каждый логин/запрос получал бы 401."""
+
+        async with self.directory.acquire() as conn:
+            if await conn.fetchval("SELECT EXISTS (SELECT 1 FROM user_directory)"):
+                return
+            if await conn.fetchval("SELECT EXISTS (SELECT 1 FROM users)"):
+                raise RuntimeError("DATABASE_SHARD_URLS is set, but user_directory is empty and DATABASE_URL has users: "
+                                   "run python -m app.tools.rebalance_shards --bootstrap first")
+
+    async def close(self) -> None:
+        for pool in self.pools:
+            await pool.close()
+
+
+async def create_shards(app: FastAPI, directory: asyncpg.Pool) -> None:
+    """Создаём пулы шардов, если заданы DATABASE_SHARD_URLS.
+    Если какой-то шард недоступен - закрываем уже созданные пулы и пробрасываем ошибку (шаг повторится целиком)."""
+    if settings.DATABASE_SHARD_URLS:
+        pools: list[asyncpg.Pool] = []
+        try:
+            for dsn in settings.DATABASE_SHARD_URLS:
+                pools.append(await asyncpg.create_pool(dsn=dsn, min_size=1, max_size=10))
+        except BaseException:
+            for pool in pools:
+                await pool.close()
+            raise
+        app.state.__setattr__(SHARDS_KEY, ShardRouter(pools, directory))
+
+
+def get_shards(app: FastAPI) -> Optional[ShardRouter]:
+    """ShardRouter или None, если шардирование выключено (всё живёт в одной БД)."""
+    return getattr(app.state, SHARDS_KEY, None)
@@ -0,0 +1,81 @@
+from __future__ import annotations
+import asyncio
+from collections import Counter
+from functools import wraps
+from typing import Any, Awaitable, Callable, Hashable
+
+from app.core.config import settings
+
+MAX_TRACKED_KEYS = 1000  # на операцию; при переполнении оставляем самые "горячие" половину
+
+
+class SingleFlight:
+    """Склейка одинаковых одновременных запросов (single-flight).
+    Если запрос с таким же ключом уже выполняется - не идём в БД второй раз,
+    а ждём тот же future. Ничего не кешируется: как только запрос завершился,
+    следующий вызов снова пойдёт в БД."""
+
+    def __init__(self) -> None:
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+        self._stats: dict[str, dict[str, int]] = {}
+        self._hot_keys: dict[str, Counter[str]] = {}
+
+    async def do(self, name: str, key: Hashable, fn: Callable[[], Awaitable[Any]], label: str | None = None) -> Any:
+        """Выполняет fn() один раз на все одновременные вызовы с ключом (name, key).
+        label - читаемое имя ключа для статистики горячих ключей (по умолчанию str(key))."""
+
+        stats = self._stats.setdefault(name, {"calls": 0, "executed": 0, "coalesced": 0})
+        stats["calls"] += 1
+
+        full_key = (name, key)
+        task = self._inflight.get(full_key)
+        if task is None:
+            stats["executed"] += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[full_key] = task
+            task.add_done_callback(lambda _t: self._inflight.pop(full_key, None))
+        else:
+            stats["coalesced"] += 1
+            self._count_key(name, label if label is not None else str(key))
+
+        # shield: отмена одного из ожидающих не должна отменять общий запрос
+        return await asyncio.shield(task)
+
+    def _count_key(self, name: str, label: str) -> None:
+        keys = self._hot_keys.setdefault(name, Counter())
+        keys[label] += 1
+        if len(keys) > MAX_TRACKED_KEYS:
+            self._hot_keys[name] = Counter(dict(keys.most_common(MAX_TRACKED_KEYS // 2)))
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        """Счётчики по каждой операции: calls / executed / coalesced."""
+
+        return {name: dict(s) for name, s in self._stats.items()}
+
+    def hot_keys(self, top: int = 20) -> dict[str, list[tuple[str, int]]]:
+        """Ключи, по которым чаще всего склеивались вызовы: {операция: [(ключ, coalesced), ...]}."""
+
+        return {name: keys.most_common(top) for name, keys in self._hot_keys.items()}
+
+    def inflight(self) -> int:
+        return len(self._inflight)
+
+
+flight = SingleFlight()
+
+
+def single_flight(name: str) -> Callable:
+    """Декоратор для read-only методов репозитория.
+    Ключ склейки - пул репозитория + аргументы вызова. Каждый вызывающий получает свою копию dict."""
+
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            if not settings.SINGLE_FLIGHT_ENABLED:
+                return await func(self, *args, **kwargs)
+            key = (id(self.read_pool), tuple(str(a) for a in args), tuple(sorted((k, str(v)) for k, v in kwargs.items())))
+            label = ", ".join([*key[1], *(f"{k}={v}" for k, v in key[2])])
+            result = await flight.do(name, key, lambda: func(self, *args, **kwargs), label=label)
+            return dict(result) if isinstance(result, dict) else result
+        return wrapper
+    return decorator
@@ -0,0 +1,147 @@
+from __future__ import annotations
+import asyncio
+import json
+import re
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from typing import Any
+
+import asyncpg
+
+from app.core.config import settings
+from app.core.logger import _mask_private_data, get_logger
+
+EXPLAIN_TIMEOUT_MS = 5000
+_STRING_LITERAL_RE = re.compile(r"'(?:[^']|'')*'")
+_EXPLAINABLE = ("select", "with", "insert", "update", "delete")
+_ANALYZE_SAFE = ("select", "with")  # ANALYZE реально выполняет запрос - только для чтения
+# ...и только без функций с побочными эффектами (SELECT pg_notify(...) тоже начинается с select)
+_VOLATILE_RE = re.compile(
+    r"\b(pg_notify|nextval|setval|set_config|pg_(try_)?advisory_\w+|pg_sleep\w*|dblink\w*|lo_\w+|pg_terminate_backend"
+    r"|pg_cancel_backend)\s*\(|\bfor\s+(no\s+key\s+)?(update|share)\b",
+    re.IGNORECASE)
+
+log = get_logger()
+
+
+def normalize_sql(query: str) -> str:
+    """Текст запроса без лишних пробелов и со строковыми литералами, заменёнными на '?'.
+    Параметры у нас и так $1, $2..., так что одинаковые запросы дают одинаковый текст."""
+
+    return _STRING_LITERAL_RE.sub("'?'", " ".join(query.split()))
+
+
+def _short(value: Any, limit: int = 200) -> Any:
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    text = str(value)
+    return text if len(text) <= limit else text[:limit] + "...(trimmed)"
+
+
+def _plan_nodes(node: dict[str, Any], out: list[str]) -> list[str]:
+    """Плоский список узлов плана: 'Index Scan using ix_users_email on users' и т.п."""
+
+    line = node.get("Node Type", "?")
+    if node.get("Index Name"):
+        line += f" using {node['Index Name']}"
+    if node.get("Relation Name"):
+        line += f" on {node['Relation Name']}"
+    out.append(line)
+    for child in node.get("Plans", ()):
+        _plan_nodes(child, out)
+    return out
+
+
+class SlowQueryLog:
+    """Медленные SQL-запросы этого воркера.
+    Каждый запрос через db.acquire() проходит через observe(); всё, что дольше SLOW_QUERY_THRESHOLD_MS,
+    попадает в ограниченный буфер (нормализованный SQL + замаскированные параметры).
+    Если включён SLOW_QUERY_EXPLAIN - для нормализованного запроса фоном снимается план
+    (не чаще раза в SLOW_QUERY_EXPLAIN_INTERVAL и не больше одного EXPLAIN одновременно)."""
+
+    def __init__(self, max_records: int, max_plans: int):
+        self.records: deque[dict[str, Any]] = deque(maxlen=max_records)
+        self.plans: OrderedDict[str, dict[str, Any]] = OrderedDict()
+        self.max_plans = max_plans
+        self._next_id = 1
+        self._explain_task: asyncio.Task | None = None
+        self.observed = 0
+        self.slow = 0
+        self.explained = 0
+        self.explain_errors = 0
+
+    def observe(self, pool: asyncpg.Pool, record) -> None:
+        """asyncpg query logger (вешается в db.acquire). Быстрые запросы - одна проверка."""
+
+        self.observed += 1
+        ms = record.elapsed * 1000
+        if ms < settings.SLOW_QUERY_THRESHOLD_MS:
+            return
+
+        sql = normalize_sql(record.query)
+        self.slow += 1
+        self.records.append({
+            "id": self._next_id,
+            "at": datetime.now(timezone.utc),
+            "sql": sql,
+            "params": [_short(v) for v in _mask_private_data(list(record.args or ()))],
+            "ms": round(ms, 2),
+            "error": f"{type(record.exception).__name__}: {record.exception}" if record.exception else None,
+        })
+        self._next_id += 1
+        log.warning("slow query %.1fms sql=%s", ms, sql[:300])
+
+        if settings.SLOW_QUERY_EXPLAIN and self._should_explain(sql):
+            self._explain_task = asyncio.create_task(self._explain(pool, sql, record.query, record.args or ()))
+
+    def _should_explain(self, sql: str) -> bool:
+        if (self._explain_task and not self._explain_task.done()) or not sql.lower().startswith(_EXPLAINABLE):
+            return False
+        plan = self.plans.get(sql)
+        return plan is None or time.monotonic() - plan["_taken"] >= settings.SLOW_QUERY_EXPLAIN_INTERVAL
+
+    async def _explain(self, pool: asyncpg.Pool, sql: str, query: str, args: tuple) -> None:
+        """EXPLAIN на отдельном соединении из того же пула (реплика/шард - те же, что у медленного запроса).
+        ANALYZE - только для чтения без volatile-функций (pg_notify, nextval, advisory-локи, FOR UPDATE ...),
+        остальное объясняем без ANALYZE (только план). Транзакция read-only, со statement_timeout
+        и всегда откатывается: даже если что-то выполнилось, NOTIFY и изменения не уйдут."""
+
+        analyze = sql.lower().startswith(_ANALYZE_SAFE) and not _VOLATILE_RE.search(sql)
+        options = "ANALYZE, BUFFERS, FORMAT JSON" if analyze else "FORMAT JSON"
+        try:
+            async with pool.acquire(timeout=1) as conn:
+                tr = conn.transaction(readonly=True)
+                await tr.start()
+                try:
+                    await conn.execute(f"SET LOCAL statement_timeout = {EXPLAIN_TIMEOUT_MS}")
+                    raw = await conn.fetchval(f"EXPLAIN ({options}) {query}", *args)
+                finally:
+                    await tr.rollback()
+            plan = json.loads(raw) if isinstance(raw, str) else raw
+            self._store_plan(sql, plan[0], analyze)
+            self.explained += 1
+        except Exception as e:
+            self.explain_errors += 1
+            log.warning("slow query explain failed err=%s sql=%s", e, sql[:300])
+
+    def _store_plan(self, sql: str, plan: dict[str, Any], analyzed: bool) -> None:
+        self.plans.pop(sql, None)
+        self.plans[sql] = {
+            "sql": sql,
+            "captured_at": datetime.now(timezone.utc),
+            "analyzed": analyzed,
+            "execution_ms": plan.get("Execution Time"),
+            "nodes": _plan_nodes(plan["Plan"], []),
+            "plan": plan,
+            "_taken": time.monotonic(),
+        }
+        while len(self.plans) > self.max_plans:
+            self.plans.popitem(last=False)
+
+    def stats(self) -> dict[str, int]:
+        return {"observed": self.observed, "slow": self.slow, "buffered": len(self.records),
+                "plans": len(self.plans), "explained": self.explained, "explain_errors": self.explain_errors}
+
+
+slow_queries = SlowQueryLog(settings.SLOW_QUERY_MAX_RECORDS, settings.SLOW_QUERY_MAX_PLANS)
@@ -0,0 +1,75 @@
+from __future__ import annotations
+# Этот модуль импортируется в main.py первым: t0 - это начало импорта приложения.
+# Поэтому здесь только stdlib, без config/pydantic.
+import asyncio
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Iterator
+
+_T0 = time.perf_counter()
+
+
+class StartupReport:
+    """Сколько стоил старт воркера: импорты и каждый шаг инициализации (мс) + когда стали ready."""
+
+    def __init__(self) -> None:
+        self.steps: dict[str, float] = {}
+        self.ready = False
+        self.ready_after_ms: float | None = None
+        self.last_error: str | None = None
+        self.attempts = 0
+
+    def record(self, name: str, ms: float) -> None:
+        self.steps[name] = round(ms, 2)
+
+    def mark_imports_done(self) -> None:
+        self.record("imports", (time.perf_counter() - _T0) * 1000)
+
+    @contextmanager
+    def step(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        yield
+        self.record(name, (time.perf_counter() - start) * 1000)
+
+    def mark_ready(self) -> None:
+        self.ready = True
+        self.last_error = None
+        self.ready_after_ms = round((time.perf_counter() - _T0) * 1000, 2)
+
+    def as_dict(self) -> dict[str, Any]:
+        return {"ready": self.ready, "ready_after_ms": self.ready_after_ms, "attempts": self.attempts,
+                "last_error": self.last_error, "steps_ms": dict(self.steps)}
+
+
+startup = StartupReport()
+
+Step = tuple[str, Callable[[], Awaitable[None]]]
+
+
+async def run_steps(steps: list[Step]) -> None:
+    """Выполняет шаги инициализации по порядку, записывая время каждого. После всех - ready."""
+
+    startup.attempts += 1
+    for name, fn in steps:
+        if name in startup.steps:
+            continue  # уже сделано в прошлой попытке
+        with startup.step(name):
+            await fn()
+    startup.mark_ready()
+
+
+async def run_steps_in_background(steps: list[Step], retry_interval: float, log) -> None:
+    """Холодный старт: инициализация идёт фоном, пока /health уже отвечает.
+    Если шаг упал (например, БД ещё не поднялась) - повторяем с того же шага."""
+
+    while True:
+        try:
+            await run_steps(steps)
+            log.info("warm-up done in %s ms steps=%s", startup.ready_after_ms, startup.steps)
+            return
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            startup.last_error = f"{type(e).__name__}: {e}"
+            log.warning("warm-up failed attempt=%s err=%s, retry in %ss", startup.attempts, e, retry_interval)
+            await asyncio.sleep(retry_interval)
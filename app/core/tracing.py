@@ -0,0 +1,236 @@
+from __future__ import annotations
+import asyncio
+import contextlib
+import json
+import os
+import pathlib
+import random
+import re
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Optional
+
+from fastapi import FastAPI
+
+from app.core.config import settings
+
+EXPORTER_KEY = "trace_exporter"
+
+# OTLP SpanKind
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+KIND_CLIENT = 3
+
+_TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+def _new_id(bits: int) -> str:
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, trace_id: str, parent_id: Optional[str], name: str, kind: int = KIND_INTERNAL,
+                 start_ns: Optional[int] = None, attributes: Optional[dict[str, Any]] = None):
+        self.trace_id = trace_id
+        self.span_id = _new_id(64)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes or {}
+        self.error: Optional[str] = None
+
+    def to_otlp(self) -> dict[str, Any]:
+        data = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_otlp_attr(k, v) for k, v in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            data["parentSpanId"] = self.parent_id
+        return data
+
+
+def _otlp_attr(key: str, value: Any) -> dict[str, Any]:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+class span:
+    """Дочерний span текущего: `with span("db.acquire"): ...`.
+    Если запрос не трассируется (нет корневого span) - ничего не делает."""
+
+    __slots__ = ("name", "kind", "attributes", "data", "token")
+
+    def __init__(self, name: str, kind: int = KIND_INTERNAL, **attributes: Any):
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self.data: Optional[Span] = None
+
+    def __enter__(self) -> Optional[Span]:
+        parent = _current_span.get()
+        if parent is not None:
+            self.data = Span(parent.trace_id, parent.span_id, self.name, self.kind, attributes=self.attributes)
+            self.token = _current_span.set(self.data)
+        return self.data
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if self.data is not None:
+            if exc is not None:
+                self.data.error = f"{exc_type.__name__}: {exc}"
+            _current_span.reset(self.token)
+            tracer.finish(self.data)
+
+
+class Tracer:
+    """Ограниченный буфер завершённых span'ов + экспорт в локальные OTLP/JSON файлы."""
+
+    def __init__(self, capacity: int):
+        self.spans: deque[Span] = deque(maxlen=capacity)
+        self._export_lock = threading.Lock()  # export идёт и в to_thread, и на loop при остановке
+        self.finished = 0
+        self.dropped = 0
+        self.exported = 0
+
+    def start_request(self, traceparent: Optional[str], name: str, **attributes: Any) -> Optional[tuple[Span, Any]]:
+        """Корневой (server) span запроса. Если пришёл валидный traceparent - продолжаем его трассу
+        и уважаем флаг sampled, иначе сами решаем по TRACING_SAMPLE_RATE."""
+
+        if not settings.TRACING_ENABLED:
+            return None
+        m = _TRACEPARENT_RE.match(traceparent or "")
+        if m:
+            if not int(m.group(3), 16) & 1:
+                return None
+            trace_id, parent_id = m.group(1), m.group(2)
+        else:
+            if random.random() >= settings.TRACING_SAMPLE_RATE:
+                return None
+            trace_id, parent_id = _new_id(128), None
+        root = Span(trace_id, parent_id, name, KIND_SERVER, attributes=attributes)
+        return root, _current_span.set(root)
+
+    def finish_request(self, started: Optional[tuple[Span, Any]], status_code: int) -> Optional[str]:
+        """Закрывает корневой span. Возвращает traceparent для ответа."""
+
+        if started is None:
+            return None
+        root, token = started
+        root.attributes["http.status_code"] = status_code
+        if status_code >= 500:
+            root.error = f"HTTP {status_code}"
+        _current_span.reset(token)
+        self.finish(root)
+        return f"00-{root.trace_id}-{root.span_id}-01"
+
+    def record_past(self, name: str, elapsed: float, error: Optional[str] = None, **attributes: Any) -> None:
+        """Span задним числом (уже известна длительность) - для SQL из asyncpg query logger."""
+
+        parent = _current_span.get()
+        if parent is None:
+            return
+        end_ns = time.time_ns()
+        data = Span(parent.trace_id, parent.span_id, name, KIND_CLIENT,
+                    start_ns=end_ns - int(elapsed * 1e9), attributes=attributes)
+        data.error = error
+        data.end_ns = end_ns
+        self._store(data)
+
+    def finish(self, data: Span) -> None:
+        data.end_ns = time.time_ns()
+        self._store(data)
+
+    def _store(self, data: Span) -> None:
+        if len(self.spans) == self.spans.maxlen:
+            self.dropped += 1  # deque сама вытеснит самый старый
+        self.spans.append(data)
+        self.finished += 1
+
+    def export(self, directory: pathlib.Path) -> Optional[pathlib.Path]:
+        """Сбрасывает накопленные span'ы в новый OTLP/JSON файл. Старые файлы сверх TRACING_MAX_FILES удаляет.
+        Экспорты идут строго по одному (lock): пачка целиком уходит в один файл, а span'ы, которые
+        дописываются в буфер во время экспорта, попадут в следующий."""
+
+        with self._export_lock:
+            return self._export(directory)
+
+    def _export(self, directory: pathlib.Path) -> Optional[pathlib.Path]:
+        batch = []
+        while self.spans:
+            batch.append(self.spans.popleft())
+        if not batch:
+            return None
+
+        directory.mkdir(parents=True, exist_ok=True)
+        payload = {"resourceSpans": [{
+            "resource": {"attributes": [_otlp_attr("service.name", settings.TRACING_SERVICE_NAME),
+                                        _otlp_attr("process.pid", os.getpid())]},
+            "scopeSpans": [{"scope": {"name": "app.core.tracing"}, "spans": [s.to_otlp() for s in batch]}],
+        }]}
+        path = directory / f"spans-{os.getpid()}-{time.time_ns() // 1_000_000}.json"
+        path.write_text(json.dumps(payload), encoding="utf-8")
+        self.exported += len(batch)
+
+        files = sorted(directory.glob(f"spans-{os.getpid()}-*.json"), key=lambda p: p.stat().st_mtime)
+        for old in files[:-settings.TRACING_MAX_FILES]:
+            old.unlink(missing_ok=True)
+        return path
+
+
+tracer = Tracer(settings.TRACING_BUFFER_SIZE)
+
+
+def trace_query(record) -> None:
+    """asyncpg query logger: span на каждый SQL-запрос (вешается в db.acquire, пока запрос трассируется)."""
+
+    tracer.record_past("db.query", record.elapsed,
+                       error=f"{type(record.exception).__name__}: {record.exception}" if record.exception else None,
+                       **{"db.system": "postgresql", "db.statement": " ".join(record.query.split())})
+
+
+async def _export_loop(directory: pathlib.Path) -> None:
+    while True:
+        await asyncio.sleep(settings.TRACING_EXPORT_INTERVAL)
+        await asyncio.to_thread(tracer.export, directory)
+
+
+async def start_trace_exporter(app: FastAPI) -> None:
+    """Запускаем фоновый экспорт span'ов в TRACING_EXPORT_DIR"""
+    if settings.TRACING_ENABLED:
+        task = asyncio.create_task(_export_loop(pathlib.Path(settings.TRACING_EXPORT_DIR)))
+        app.state.__setattr__(EXPORTER_KEY, task)
+
+
+async def stop_trace_exporter(app: FastAPI) -> None:
+    """Останавливаем экспорт (дожидаемся, пока задача действительно завершится) и дописываем остаток буфера.
+    Уже запущенный в потоке export отменой не прерывается - финальный export дождётся его на lock."""
+    task: asyncio.Task | None = getattr(app.state, EXPORTER_KEY, None)
+    if task is None:
+        return
+    task.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await task
+    await asyncio.to_thread(tracer.export, pathlib.Path(settings.TRACING_EXPORT_DIR))
@@ -0,0 +1,91 @@
+from fastapi import Response
+from app.models.admin import AuthEventsExport, MetricsOut, ProfilingState, SlowQueriesExport
+
+class AdminDocs:
+    auth_events = {
+        "summary": "Export auth events (superuser)",
+        "description": (
+            "Возвращает последние auth-события из таблицы auth_events (новые сверху) "
+            "и счётчики буфера (buffered/dropped/flushed). "
+            "События пишутся в БД фоном пачками, поэтому самые свежие могут появиться с задержкой "
+            "~AUTH_EVENTS_FLUSH_INTERVAL."
+        ),
+        "response_model": AuthEventsExport,
+        "responses": {
+            200: {"description": "OK"},
+            401: {"description": "Missing/invalid token"},
+            403: {"description": "Superuser required"},
+        },
+    }
+
+    profiling_get = {
+        "summary": "Profiling mode state and recent profiles (superuser)",
+        "description": (
+            "Текущие настройки профилирования и последние записанные профили запросов "
+            "(тайминги фаз: middleware, route, get_current_user, вызовы репозиториев, db.acquire, "
+            "logger.mask, хеширование, encode/decode JWT)."
+        ),
+        "response_model": ProfilingState,
+        "responses": {
+            200: {"description": "OK"},
+            403: {"description": "Superuser required"},
+        },
+    }
+
+    profiling_set = {
+        "summary": "Enable/disable profiling mode (superuser)",
+        "description": (
+            "Включает/выключает профилирование на этом воркере. "
+            "Профилируется доля sample_rate запросов; запрос с заголовком `X-Profile: <PROFILING_FORCE_SECRET>` "
+            "профилируется всегда, пока режим включён. Выключенный режим не добавляет накладных расходов."
+        ),
+        "response_model": ProfilingState,
+        "responses": {
+            200: {"description": "Updated"},
+            403: {"description": "Superuser required"},
+        },
+    }
+
+    profiling_dump = {
+        "summary": "Download cProfile dump (superuser)",
+        "description": (
+            "Отдаёт cProfile-дамп профиля по id (формат pstats, открывается `python -m pstats` или snakeviz). "
+            "Дамп - это вся работа воркера (потока event loop) за время запроса, а не только этого запроса: "
+            "в него попадают и другие корутины, выполнявшиеся параллельно. Для чистого дампа одного запроса "
+            "снимайте его на воркере без другой нагрузки. Тайминги фаз в самом профиле - только этого запроса."
+        ),
+        "response_class": Response,
+        "responses": {
+            200: {"description": "pstats file", "content": {"application/octet-stream": {}}},
+            404: {"description": "Dump not found (evicted or never captured)"},
+        },
+    }
+
+    slow_queries = {
+        "summary": "Slow SQL queries and their plans (superuser)",
+        "description": (
+            "Последние SQL-запросы этого воркера дольше SLOW_QUERY_THRESHOLD_MS: нормализованный текст, "
+            "замаскированные параметры, время. Если включён SLOW_QUERY_EXPLAIN - ещё и планы "
+            "(EXPLAIN (ANALYZE, BUFFERS) для SELECT, просто EXPLAIN для записи) с плоским списком узлов, "
+            "чтобы сразу видеть Seq Scan вместо Index Scan по users.email / refresh_tokens.jti."
+        ),
+        "response_model": SlowQueriesExport,
+        "responses": {
+            200: {"description": "OK"},
+            403: {"description": "Superuser required"},
+        },
+    }
+
+    metrics = {
+        "summary": "In-process performance counters (superuser)",
+        "description": (
+            "Счётчики оптимизаций этого воркера: single-flight по операциям (calls / executed / coalesced "
+            "и самые горячие ключи), кеш проверенных JWT (hits / misses / evictions), group commit выдачи refresh "
+            "(REFRESH_BATCH_ENABLED, пусто - если выключен или ещё не было выдач)."
+        ),
+        "response_model": MetricsOut,
+        "responses": {
+            200: {"description": "OK"},
+            403: {"description": "Superuser required"},
+        },
+    }
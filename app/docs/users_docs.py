@@ -1,3 +1,4 @@
+from fastapi.responses import StreamingResponse
 from app.models.users import UserOut
 
 class UsersDocs:
@@ -45,4 +46,21 @@ class UsersDocs:
             200: {"description": "User deleted"},
             404: {"description": "User not found"},
         },
-    }
\ No newline at end of file
+    }
+
+
+    events = {
+        "summary": "Session revocation events (SSE)",
+        "description": (
+            "Server-Sent Events поток для текущего пользователя вместо опроса `/users/me`. "
+            "Сервер присылает `event: revoked` (data: kind/reason/jti), когда сессии пользователя отозваны: "
+            "смена пароля, удаление аккаунта, logout этой сессии. После события поток закрывается. "
+            "Между событиями раз в ~SSE_KEEPALIVE секунд приходит комментарий-keepalive."
+        ),
+        "response_class": StreamingResponse,
+        "responses": {
+            200: {"description": "Event stream", "content": {"text/event-stream": {}}},
+            401: {"description": "Missing/invalid token or inactive user"},
+            503: {"description": "Too many event streams on this worker/user"},
+        },
+    }
@@ -1,3 +1,5 @@
+from app.core.startup import startup, run_steps, run_steps_in_background  # первым: отсюда считаем время старта
+import asyncio
 from contextlib import asynccontextmanager
 from uuid import uuid4
 import time
@@ -9,19 +11,49 @@ from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
 
 from app.core.db import create_pool, close_pool, run_migrations
+from app.core.events import start_event_flusher, stop_event_flusher
+from app.core.revocations import start_revocation_listener, stop_revocation_listener
+from app.core.tracing import tracer, start_trace_exporter, stop_trace_exporter
 from app.core.config import settings
 from app.api.auth_router import router as auth_router
 from app.api.users_router import router as users_router
+from app.api.admin_router import router as admin_router
 from app.core.logger import get_logger 
+from app.core.admission import gate_for
+from app.core.profiling import profiler
+from app.core.security import warm_up
 
 log = get_logger()
+startup.mark_imports_done()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    await create_pool(app)
-    await run_migrations(app)
+    """Обычный режим: пул + миграции до того, как начнём принимать запросы.
+    COLD_START_MODE: всё это идёт фоном, /health отвечает сразу, готовность - в /ready."""
+
+    async def _warm_imports() -> None:
+        warm_up()
+
+    steps = [
+        ("create_pool", lambda: create_pool(app)),
+        ("run_migrations", lambda: run_migrations(app)),
+        ("start_event_flusher", lambda: start_event_flusher(app)),
+        ("start_revocation_listener", lambda: start_revocation_listener(app)),
+        ("warm_imports", _warm_imports),
+    ]
+    await start_trace_exporter(app)  # не зависит от БД, трассируем и запросы во время прогрева
+    warmup_task = None
+    if settings.COLD_START_MODE:
+        warmup_task = asyncio.create_task(run_steps_in_background(steps, settings.COLD_START_RETRY_INTERVAL, log))
+    else:
+        await run_steps(steps)
     yield
+    if warmup_task:
+        warmup_task.cancel()
+    await stop_trace_exporter(app)
+    await stop_revocation_listener(app)
+    await stop_event_flusher(app)
     await close_pool(app)
 
 
@@ -39,21 +71,85 @@ app.add_middleware(
 app.add_middleware(TrustedHostMiddleware, allowed_hosts=settings.ALLOWED_HOSTS)
 
 
+@app.middleware("http")
+async def profile_request(request: Request, call_next):
+    """Профилирование по запросу: если режим включён (/admin/profiling), пишем тайминги фаз
+    для доли запросов или для запроса с заголовком X-Profile: <PROFILING_FORCE_SECRET>. Выключен - просто пропускаем дальше.
+    Регистрируется первым (самый внутренний middleware): в профиль не попадает ожидание в очереди admission control."""
+
+    if not profiler.enabled or not profiler.should_profile(request.headers.get("X-Profile")):
+        return await call_next(request)
+
+    prof, token, cp = profiler.begin()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        profiler.end(prof, token, cp, getattr(request.state, "request_id", "-"),
+                     request.method, request.url.path, status_code)
+
+
+@app.middleware("http")
+async def enforce_origin_allowlist(request: Request, call_next):
+    """Если пришёл браузерный запрос с Origin не из allowlist — режем 403. (Preflight OPTIONS не блокируем.)"""
+
+    origin = request.headers.get("Origin")
+    if origin and origin not in settings.CORS_ALLOW_ORIGINS and request.method != "OPTIONS":
+        return JSONResponse({"detail": "Origin not allowed"}, status_code=403)
+    return await call_next(request)
+
+
+@app.middleware("http")
+async def admission_control(request: Request, call_next):
+    """Admission control: у каждого класса маршрутов (read / token / hash) свой лимит одновременных запросов.
+    Сверх лимита - короткая очередь с дедлайном, дальше сразу 503 + Retry-After.
+    Регистрируется предпоследним: снаружи только add_request_id_and_access_log (у отказа есть X-Request-ID
+    и строка access-лога), а лишнее отбивается до проверки Origin, профилирования и самого обработчика."""
+
+    gate = gate_for(request.method, request.url.path) if settings.ADMISSION_ENABLED else None
+    if gate is None:
+        return await call_next(request)
+
+    if not await gate.acquire():
+        log.warning("admission rejected class=%s path=%s", gate.name, request.url.path)
+        return JSONResponse(
+            {"detail": "Service overloaded, retry later"},
+            status_code=503,
+            headers={"Retry-After": str(settings.ADMISSION_RETRY_AFTER)}
+            )
+    try:
+        return await call_next(request)
+    finally:
+        gate.release()
+
+
 @app.middleware("http")
 async def add_request_id_and_access_log(request: Request, call_next):
     """Для каждого запроса:
     - генерим request_id (возвращаем в X-Request-ID)
     - меряем время выполнения
-    - ловим неожиданные исключения → отдаём 500 + пишем лог"""
+    - открываем корневой span трассы (TRACING_ENABLED), продолжая входящий traceparent
+    - ловим неожиданные исключения → отдаём 500 + пишем лог
+    Регистрируется последним, т.е. работает самым первым: X-Request-ID и access-лог есть у любого ответа,
+    включая 503 от admission control и 403 от проверки Origin."""
     request_id = str(uuid4())
     request.state.request_id = request_id
+    trace = tracer.start_request(
+        request.headers.get("traceparent"),
+        f"{request.method} {request.url.path}",
+        **{"http.method": request.method, "http.target": request.url.path, "request.id": request_id}
+        )
 
     start = time.perf_counter()
     try:
         response = await call_next(request)
     except HTTPException:
+        tracer.finish_request(trace, 500)
         raise
     except Exception:
+        tracer.finish_request(trace, 500)
         log.exception(
             "unhandled exception",
             extra={"request_id": request_id, "method": request.method, "path": request.url.path}
@@ -63,6 +159,10 @@ async def add_request_id_and_access_log(request: Request, call_next):
             status_code=500
             )
 
+    traceparent = tracer.finish_request(trace, response.status_code)
+    if traceparent:
+        response.headers["traceparent"] = traceparent
+
     dur_ms = int((time.perf_counter() - start) * 1000)
     log.info(
         "request done",
@@ -78,16 +178,6 @@ async def add_request_id_and_access_log(request: Request, call_next):
     return response
 
 
-@app.middleware("http")
-async def enforce_origin_allowlist(request: Request, call_next):
-    """Если пришёл браузерный запрос с Origin не из allowlist — режем 403. (Preflight OPTIONS не блокируем.)"""
-
-    origin = request.headers.get("Origin")
-    if origin and origin not in settings.CORS_ALLOW_ORIGINS and request.method != "OPTIONS":
-        return JSONResponse({"detail": "Origin not allowed"}, status_code=403)
-    return await call_next(request)
-
-
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
     """Логируем HTTP-исключения (401/403/409 и т.д.) как warning, и отдаём аккуратный JSON."""
@@ -126,8 +216,17 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
 
 app.include_router(auth_router, prefix="/auth", tags=["auth"])
 app.include_router(users_router, prefix="/users", tags=["users"])
+app.include_router(admin_router, prefix="/admin", tags=["admin"])
 
 
 @app.get("/health")
 async def health():
     return {"status": "ok"}
+
+
+@app.get("/ready")
+async def ready():
+    """Readiness: 200, когда пул создан и миграции накатаны, иначе 503. Плюс отчёт о времени старта."""
+
+    report = startup.as_dict()
+    return JSONResponse(report, status_code=200 if startup.ready else 503)
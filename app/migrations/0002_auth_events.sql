@@ -0,0 +1,13 @@
+CREATE TABLE IF NOT EXISTS auth_events (
+    id BIGSERIAL PRIMARY KEY,
+    event_type TEXT NOT NULL,
+    user_id UUID NULL,
+    email TEXT NULL,
+    ip TEXT NULL,
+    user_agent TEXT NULL,
+    request_id TEXT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_auth_events_created_at ON auth_events(created_at);
+CREATE INDEX IF NOT EXISTS idx_auth_events_user_id ON auth_events(user_id);
@@ -0,0 +1,9 @@
+-- Директория email -> шард. Используется только при шардировании (DATABASE_SHARD_URLS)
+-- и живёт в основной БД (DATABASE_URL); на шардах таблица остаётся пустой.
+CREATE TABLE IF NOT EXISTS user_directory (
+    email TEXT PRIMARY KEY,
+    user_id UUID NOT NULL UNIQUE,
+    shard INT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_user_directory_shard ON user_directory(shard);
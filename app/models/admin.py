@@ -0,0 +1,93 @@
+from __future__ import annotations
+from datetime import datetime
+from typing import Any
+from pydantic import BaseModel, Field
+
+
+class AuthEventOut(BaseModel):
+    id: int
+    event_type: str
+    user_id: str | None = None
+    email: str | None = None
+    ip: str | None = None
+    user_agent: str | None = None
+    request_id: str | None = None
+    created_at: datetime
+
+
+class AuthEventsExport(BaseModel):
+    stats: dict[str, int]
+    events: list[AuthEventOut]
+
+
+class ProfilingConfig(BaseModel):
+    enabled: bool
+    sample_rate: float = Field(ge=0, le=1, description="Доля профилируемых запросов (0..1)")
+    cprofile: bool = Field(False, description="Снимать cProfile-дамп для профилируемых запросов "
+                                               "(вся работа воркера за время запроса, включая параллельные)")
+
+
+class ProfilePhase(BaseModel):
+    name: str
+    ms: float
+
+
+class ProfileRecord(BaseModel):
+    id: int
+    request_id: str
+    method: str
+    path: str
+    status: int
+    total_ms: float
+    phases: list[ProfilePhase]
+    has_dump: bool
+
+
+class ProfilingState(BaseModel):
+    config: ProfilingConfig
+    records: list[ProfileRecord]
+
+
+class SlowQueryOut(BaseModel):
+    id: int
+    at: datetime
+    sql: str
+    params: list[Any] = Field(description="Параметры запроса, замаскированные как в логах")
+    ms: float
+    error: str | None = None
+
+
+class QueryPlanOut(BaseModel):
+    sql: str
+    captured_at: datetime
+    analyzed: bool = Field(description="EXPLAIN ANALYZE (для SELECT) или только план (для записи)")
+    execution_ms: float | None = None
+    nodes: list[str] = Field(description="Узлы плана: 'Index Scan using ... on users', 'Seq Scan on ...'")
+    plan: dict[str, Any]
+
+
+class SlowQueriesExport(BaseModel):
+    threshold_ms: float
+    explain_enabled: bool
+    stats: dict[str, int]
+    queries: list[SlowQueryOut]
+    plans: list[QueryPlanOut]
+
+
+class SingleFlightKey(BaseModel):
+    key: str
+    coalesced: int
+
+
+class SingleFlightStats(BaseModel):
+    calls: int
+    executed: int
+    coalesced: int
+    hot_keys: list[SingleFlightKey] = Field(description="Ключи, по которым чаще всего склеивались вызовы")
+
+
+class MetricsOut(BaseModel):
+    single_flight: dict[str, SingleFlightStats] = Field(description="Single-flight по операциям (SINGLE_FLIGHT_ENABLED)")
+    token_cache: dict[str, int] = Field(description="Кеш проверенных JWT (TOKEN_CACHE_ENABLED): hits / misses / evictions")
+    refresh_batching: list[dict[str, float]] = Field(
+        description="Group commit выдачи refresh (по пулу): размер пачек, время INSERT и ожидания вызывающих")
@@ -0,0 +1,44 @@
+from __future__ import annotations
+from datetime import datetime
+from typing import Any, Optional
+from uuid import UUID
+import asyncpg
+from app.core.db import acquire
+from app.core.logger import get_logger, simple_logger
+from app.core.profiling import profiled
+
+AUTH_EVENT_COLUMNS = ("event_type", "user_id", "email", "ip", "user_agent", "request_id", "created_at")
+
+
+class AuthEventsRepo:
+    def __init__(self, pool: asyncpg.Pool):
+        self.pool = pool
+        self.logger = get_logger()
+
+
+    @simple_logger
+    @profiled
+    async def insert_many(self, records: list[tuple]) -> None:
+        """Пишет пачку событий через COPY. records - кортежи в порядке AUTH_EVENT_COLUMNS."""
+
+        async with acquire(self.pool) as conn:
+            await conn.copy_records_to_table("auth_events", records=records, columns=AUTH_EVENT_COLUMNS)
+
+
+    @simple_logger
+    @profiled
+    async def recent(self, limit: int = 100, event_type: Optional[str] = None,
+                   user_id: Optional[UUID] = None, since: Optional[datetime] = None) -> list[dict[str, Any]]:
+        """Последние события (новые сверху) с необязательными фильтрами."""
+
+        async with acquire(self.pool) as conn:
+            rows = await conn.fetch(
+                """SELECT id, event_type, user_id, email, ip, user_agent, request_id, created_at
+                FROM auth_events
+                WHERE ($1::text IS NULL OR event_type = $1)
+                  AND ($2::uuid IS NULL OR user_id = $2)
+                  AND ($3::timestamptz IS NULL OR created_at >= $3)
+                ORDER BY created_at DESC
+                LIMIT $4""",
+                event_type, user_id, since, limit)
+            return [dict(r) for r in rows]
@@ -1,64 +1,242 @@
 from __future__ import annotations
+import asyncio
+import time
+from datetime import datetime, timezone
 from typing import Any, Optional
 from uuid import UUID
 import asyncpg
+from app.core.config import settings
+from app.core.db import acquire
 from app.core.logger import get_logger, simple_logger
+from app.core.profiling import profiled
+from app.core.revocations import notify_revocation
+from app.core.sharding import ShardRouter
+from app.core.singleflight import single_flight
+
+_ISSUE_SQL = """INSERT INTO refresh_tokens (user_id, jti, expires_at, ip, user_agent)
+                VALUES ($1, $2, to_timestamp($3), $4, $5)"""
+
+_ISSUE_MANY_SQL = """INSERT INTO refresh_tokens (user_id, jti, expires_at, ip, user_agent)
+                SELECT * FROM unnest($1::uuid[], $2::uuid[], $3::timestamptz[], $4::text[], $5::text[])"""
+
+
+class IssueBatcher:
+    """Group commit для issue(): копим строки max_delay_ms или до max_rows и пишем одним INSERT.
+    Каждый вызывающий ждёт, пока его строка реально закоммичена.
+    Если пачка упала (например, дубликат jti) - досылаем строки по одной, чтобы ошибка досталась только своему вызову."""
+
+    def __init__(self, pool: asyncpg.Pool, max_rows: int, max_delay_ms: float):
+        self.pool = pool
+        self.max_rows = max_rows
+        self.max_delay = max_delay_ms / 1000
+        self.logger = get_logger()
+        self._pending: list[tuple[tuple, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+        self.batches = 0
+        self.rows = 0
+        self.max_batch = 0
+        self.flush_ms_total = 0.0
+        self.flush_ms_max = 0.0
+        self.waits = 0
+        self.wait_ms_total = 0.0
+        self.wait_ms_max = 0.0
+
+    async def submit(self, user_id: UUID, jti: UUID, exp_ts: int, ip: str | None, user_agent: str | None) -> None:
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending.append(((user_id, jti, exp_ts, ip, user_agent), fut))
+        if len(self._pending) >= self.max_rows:
+            self._flush_now()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._flush_now)
+        start = time.perf_counter()
+        try:
+            await fut
+        finally:
+            # сколько вызывающий ждал коммита своей строки: накопление пачки + сам INSERT
+            wait_ms = (time.perf_counter() - start) * 1000
+            self.waits += 1
+            self.wait_ms_total += wait_ms
+            self.wait_ms_max = max(self.wait_ms_max, wait_ms)
+
+    def _flush_now(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._flush(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _flush(self, batch: list[tuple[tuple, asyncio.Future]]) -> None:
+        start = time.perf_counter()
+        rows = [r for r, _ in batch]
+        try:
+            async with acquire(self.pool) as conn:
+                await conn.execute(
+                    _ISSUE_MANY_SQL,
+                    [r[0] for r in rows], [r[1] for r in rows],
+                    [datetime.fromtimestamp(r[2], tz=timezone.utc) for r in rows],
+                    [r[3] for r in rows], [r[4] for r in rows])
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_result(None)
+        except Exception as e:
+            self.logger.warning("issue batch failed size=%s err=%s, retrying one by one", len(batch), e)
+            await self._flush_one_by_one(batch)
+
+        dur_ms = (time.perf_counter() - start) * 1000
+        self.batches += 1
+        self.rows += len(batch)
+        self.max_batch = max(self.max_batch, len(batch))
+        self.flush_ms_total += dur_ms
+        self.flush_ms_max = max(self.flush_ms_max, dur_ms)
+
+    async def _flush_one_by_one(self, batch: list[tuple[tuple, asyncio.Future]]) -> None:
+        for row, fut in batch:
+            try:
+                async with acquire(self.pool) as conn:
+                    await conn.execute(_ISSUE_SQL, *row)
+            except Exception as e:
+                if not fut.done():
+                    fut.set_exception(e)
+            else:
+                if not fut.done():
+                    fut.set_result(None)
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "batches": self.batches,
+            "rows": self.rows,
+            "avg_batch": round(self.rows / self.batches, 2) if self.batches else 0,
+            "max_batch": self.max_batch,
+            "avg_flush_ms": round(self.flush_ms_total / self.batches, 2) if self.batches else 0,
+            "max_flush_ms": round(self.flush_ms_max, 2),
+            "avg_wait_ms": round(self.wait_ms_total / self.waits, 2) if self.waits else 0,
+            "max_wait_ms": round(self.wait_ms_max, 2),
+            "pending": len(self._pending),
+        }
+
+
+_batchers: dict[int, IssueBatcher] = {}
+
+
+def issue_batcher_stats() -> list[dict[str, float]]:
+    """Счётчики всех batcher'ов воркера (по одному на пул: основная БД или шард)."""
+
+    return [b.stats() for b in _batchers.values()]
+
+
+def get_issue_batcher(pool: asyncpg.Pool) -> IssueBatcher:
+    """Один batcher на пул (репозитории создаются на каждый запрос, а копить строки надо общими)."""
+
+    batcher = _batchers.get(id(pool))
+    if batcher is None:
+        batcher = IssueBatcher(pool, settings.REFRESH_BATCH_MAX_ROWS, settings.REFRESH_BATCH_MAX_DELAY_MS)
+        _batchers[id(pool)] = batcher
+    return batcher
+
 
 class RefreshTokensRepo:
-    def __init__(self, pool: asyncpg.Pool):
+    def __init__(self, pool: asyncpg.Pool, read_pool: asyncpg.Pool | None = None, shards: ShardRouter | None = None):
         self.pool = pool
+        self.read_pool = read_pool or pool  # реплика для read-only методов (см. get_read_pool)
+        self.shards = shards                # если задан - токены живут на шарде своего пользователя
         self.logger = get_logger()
 
 
+    async def _user_pool(self, user_id: str | UUID) -> asyncpg.Pool:
+        """Пул шарда пользователя (или primary без шардирования)."""
+
+        return await self.shards.pool_for_user(user_id) if self.shards else self.pool
+
+
+    async def _jti_pools(self, user_id: str | UUID | None, read: bool = False) -> list[asyncpg.Pool]:
+        """Где искать токен по jti: шард владельца, если он известен, иначе все шарды."""
+
+        if not self.shards:
+            return [self.read_pool if read else self.pool]
+        if user_id is not None:
+            return [await self.shards.pool_for_user(user_id)]
+        return self.shards.pools
+
+
     @simple_logger
+    @profiled
     async def issue(self, user_id: UUID, jti: UUID, exp_ts: int, ip: str | None, user_agent: str | None) -> None:
-        """Регистрирует выдачу нового refresh-токена. exp_ts — это время, когда токен истечёт (в unix timestamp)."""
+        """Регистрирует выдачу нового refresh-токена. exp_ts — это время, когда токен истечёт (в unix timestamp).
+        При REFRESH_BATCH_ENABLED строка уходит в общий group commit (см. IssueBatcher)."""
 
-        async with self.pool.acquire() as conn:
-            await conn.execute(
-                """INSERT INTO refresh_tokens (user_id, jti, expires_at, ip, user_agent)
-                VALUES ($1, $2, to_timestamp($3), $4, $5)""",
-                user_id, jti, exp_ts, ip, user_agent)
+        pool = await self._user_pool(user_id)
+        if settings.REFRESH_BATCH_ENABLED:
+            await get_issue_batcher(pool).submit(user_id, jti, exp_ts, ip, user_agent)
+            return
+
+        async with acquire(pool) as conn:
+            await conn.execute(_ISSUE_SQL, user_id, jti, exp_ts, ip, user_agent)
 
 
     @simple_logger
-    async def get_by_jti(self, jti: str | UUID) -> Optional[dict[str, Any]]:
-        """Возвращает запись по jti или None, если не нашли."""
+    @profiled
+    @single_flight("refresh_tokens.get_by_jti")
+    async def get_by_jti(self, jti: str | UUID, user_id: str | UUID | None = None) -> Optional[dict[str, Any]]:
+        """Возвращает запись по jti или None, если не нашли.
+        user_id (sub из токена) нужен только при шардировании, чтобы не обходить все шарды."""
 
-        async with self.pool.acquire() as conn:
-            row = await conn.fetchrow("SELECT id, user_id, jti, revoked_at, expires_at FROM refresh_tokens WHERE jti = $1", jti)
-            return dict(row) if row else None
+        for pool in await self._jti_pools(user_id, read=True):
+            async with acquire(pool) as conn:
+                row = await conn.fetchrow("SELECT id, user_id, jti, revoked_at, expires_at FROM refresh_tokens WHERE jti = $1", jti)
+            if row:
+                return dict(row)
+        return None
 
 
     @simple_logger
-    async def revoke(self, jti: str | UUID, reason: str | None = None) -> None:
+    @profiled
+    async def revoke(self, jti: str | UUID, reason: str | None = None, user_id: str | UUID | None = None,
+                     replaced_by: str | UUID | None = None) -> None:
         """Отзывает refresh-токен (если ещё не отозван). 
-        revoked_at проставляется текущим временем."""
+        revoked_at проставляется текущим временем. Если что-то отозвали - NOTIFY для SSE-клиентов.
+        replaced_by - jti нового токена при ротации (SSE-поток сессии переключается на него)."""
 
-        async with self.pool.acquire() as conn:
-            await conn.execute(
-                """UPDATE refresh_tokens
-                SET revoked_at = now(), revoke_reason = COALESCE($2, revoke_reason)
-                WHERE jti = $1 AND revoked_at IS NULL
-                """,
-                jti, reason)
+        for pool in await self._jti_pools(user_id):
+            async with acquire(pool) as conn:
+                owner = await conn.fetchval(
+                    """UPDATE refresh_tokens
+                    SET revoked_at = now(), revoke_reason = COALESCE($2, revoke_reason)
+                    WHERE jti = $1 AND revoked_at IS NULL
+                    RETURNING user_id
+                    """,
+                    jti, reason)
+                if owner is not None:
+                    await notify_revocation(conn, "session_revoked", owner, jti=jti, reason=reason,
+                                            replaced_by=replaced_by)
             
 
     @simple_logger
+    @profiled
     async def revoke_all_for_user(self, user_id: UUID, reason: str | None = None) -> None:
-        """Отзывает все активные refresh токены пользователя (например, force logout со всех устройств)."""
+        """Отзывает все активные refresh токены пользователя (например, force logout со всех устройств).
+        NOTIFY отправляем всегда: у клиента может быть живой access и без активных refresh."""
 
-        async with self.pool.acquire() as conn:
+        async with acquire(await self._user_pool(user_id)) as conn:
             await conn.execute(
                 "UPDATE refresh_tokens SET revoked_at = now(), revoke_reason = COALESCE($2, revoke_reason) WHERE user_id = $1 AND revoked_at IS NULL",
                 user_id, reason)
+            await notify_revocation(conn, "all_sessions_revoked", user_id, reason=reason)
 
 
     @simple_logger
+    @profiled
     async def purge_expired(self) -> int:
         """Удаляет из таблицы все refresh токены, срок которых уже истёк.
-        Возвращает количество удалённых строк."""
+        Возвращает количество удалённых строк (суммарно по всем шардам)."""
 
-        async with self.pool.acquire() as conn:
-            res = await conn.execute("DELETE FROM refresh_tokens WHERE expires_at < now()")
-            return int(res.split(" ")[1])
\ No newline at end of file
+        total = 0
+        for pool in (self.shards.pools if self.shards else [self.pool]):
+            async with acquire(pool) as conn:
+                res = await conn.execute("DELETE FROM refresh_tokens WHERE expires_at < now()")
+            total += int(res.split(" ")[1])
+        return total
\ No newline at end of file
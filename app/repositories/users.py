@@ -1,41 +1,72 @@
 from __future__ import annotations
 from typing import Any, Optional, Union
-from uuid import UUID
+from uuid import UUID, uuid4
+from app.core.db import acquire
+from app.core.sharding import ShardRouter
 from app.core.logger import get_logger, simple_logger
+from app.core.profiling import profiled
+from app.core.revocations import notify_revocation
+from app.core.singleflight import single_flight
 
 import asyncpg
 
 
 class UsersRepo:
-    def __init__(self, pool: asyncpg.Pool):
+    def __init__(self, pool: asyncpg.Pool, read_pool: asyncpg.Pool | None = None, shards: ShardRouter | None = None):
         self.pool = pool
+        self.read_pool = read_pool or pool  # реплика для read-only методов (см. get_read_pool)
+        self.shards = shards                # если задан - users живут на шардах (см. get_shards)
         self.logger = get_logger()
 
 
+    async def _user_pool(self, user_id: str | UUID, read: bool = False) -> asyncpg.Pool:
+        """Пул, где живёт пользователь: его шард, а без шардирования - primary (или реплика для чтения)."""
+
+        if self.shards:
+            return await self.shards.pool_for_user(user_id)
+        return self.read_pool if read else self.pool
+
+
     @simple_logger
+    @profiled
+    @single_flight("users.get_by_id")
     async def get_by_id(self, user_id: str | UUID) -> Optional[dict[str, Any]]:
         """Возвращает пользователя по ID или None, если не нашёл.
         Поля: id, email, password_hash, is_active, is_superuser, created_at"""
 
-        async with self.pool.acquire() as conn:
+        async with acquire(await self._user_pool(user_id, read=True)) as conn:
             row = await conn.fetchrow("SELECT id, email, password_hash, is_active, is_superuser, created_at FROM users WHERE id = $1", user_id)
             return dict(row) if row else None
 
 
     @simple_logger
+    @profiled
     async def get_by_email(self, email: str) -> Optional[dict[str, Any]]:
-        """Возвращает пользователя по email или None."""
+        """Возвращает пользователя по email или None.
+        При шардировании шард берётся из директории email -> shard."""
 
-        async with self.pool.acquire() as conn:
+        pool = self.read_pool
+        if self.shards:
+            entry = await self.shards.lookup_email(email)
+            if not entry:
+                return None
+            pool = self.shards.pools[entry["shard"]]
+
+        async with acquire(pool) as conn:
             row = await conn.fetchrow("SELECT id, email, password_hash, is_active, is_superuser, created_at FROM users WHERE email = $1", email)
             return dict(row) if row else None
 
 
     @simple_logger
+    @profiled
     async def create(self, email: str, password_hash: str) -> dict[str, Any]:
-        """Создаёт пользователя и возвращает созданную строку. Уникальность email обеспечивается уникальным индексом в БД."""
+        """Создаёт пользователя и возвращает созданную строку. Уникальность email обеспечивается уникальным индексом в БД
+        (при шардировании - первичным ключом директории)."""
+
+        if self.shards:
+            return await self._create_sharded(email, password_hash)
 
-        async with self.pool.acquire() as conn:
+        async with acquire(self.pool) as conn:
             row = await conn.fetchrow(
                 """INSERT INTO users (email, password_hash)
                 VALUES ($1, $2)
@@ -43,13 +74,36 @@ class UsersRepo:
                 email,
                 password_hash)
             return dict(row)
-        
+
+
+    async def _create_sharded(self, email: str, password_hash: str) -> dict[str, Any]:
+        """id генерируем сами, чтобы заранее знать шард. Сначала резервируем email в директории,
+        если вставка в шард не удалась - снимаем резерв."""
+
+        user_id = uuid4()
+        shard = self.shards.home_shard(user_id)
+        await self.shards.register_email(email, user_id, shard)
+        try:
+            async with acquire(self.shards.pools[shard]) as conn:
+                row = await conn.fetchrow(
+                    """INSERT INTO users (id, email, password_hash)
+                    VALUES ($1, $2, $3)
+                    RETURNING id, email, password_hash, is_active, is_superuser, created_at""",
+                    user_id,
+                    email,
+                    password_hash)
+        except Exception:
+            await self.shards.forget_email(email)
+            raise
+        return dict(row)
+
     
     @simple_logger
+    @profiled
     async def update_password_by_id(self, user_id: Union[str, UUID], new_password_hash: str) -> bool:
         """Обновляет пароль пользователя по ID. Возвращает True если что-то обновилось."""
 
-        async with self.pool.acquire() as conn:
+        async with acquire(await self._user_pool(user_id)) as conn:
             res = await conn.execute(
                 "UPDATE users SET password_hash = $2 WHERE id = $1",
                 user_id,
@@ -59,8 +113,22 @@ class UsersRepo:
 
 
     @simple_logger
+    @profiled
     async def delete_by_email(self, email: str) -> bool:
         """Удаляет пользователя по email. Возвращает True, если пользователь был удалён."""
-        async with self.pool.acquire() as conn:
-            res = await conn.execute("DELETE FROM users WHERE email = $1", email)
-            return res.split(" ")[0] == "DELETE" and int(res.split(" ")[1]) > 0
\ No newline at end of file
+
+        pool = self.pool
+        if self.shards:
+            entry = await self.shards.lookup_email(email)
+            if not entry:
+                return False
+            pool = self.shards.pools[entry["shard"]]
+
+        async with acquire(pool) as conn:
+            deleted_id = await conn.fetchval("DELETE FROM users WHERE email = $1 RETURNING id", email)
+            if deleted_id is not None:
+                await notify_revocation(conn, "user_deleted", deleted_id)
+        deleted = deleted_id is not None
+        if self.shards:
+            await self.shards.forget_email(email)
+        return deleted
\ No newline at end of file
@@ -0,0 +1,230 @@
+"""Ребалансировка пользователей после добавления шарда.
+
+Порядок действий:
+    1) добавить новый URL в КОНЕЦ DATABASE_SHARD_URLS и выставить SHARD_REBALANCE_IN_PROGRESS=true
+       (сервис начинает искать шард пользователя через user_directory, а не по кольцу);
+    2) выкатить сервис (миграции накатятся и на новый шард);
+    3) python -m app.tools.rebalance_shards [--dry-run] [--batch 500]
+    4) убрать SHARD_REBALANCE_IN_PROGRESS и выкатить ещё раз.
+
+Для каждого пользователя, у которого шард в директории не совпадает с кольцом:
+под блокировкой строк на старом шарде копируем users + refresh_tokens на новый и переключаем директорию,
+через --grace секунд доносим изменения, успевшие прийти в старый шард, и удаляем его копию (см. _copy_and_switch / _finish_move).
+Копирование идемпотентно (ON CONFLICT), поэтому прерванный запуск можно просто повторить.
+
+Первое включение шардирования на существующей БД (--bootstrap):
+    1) остановить сервис (или оставить его без записи): изменения, сделанные во время копирования, не перенесутся;
+    2) DATABASE_SHARD_URLS=... python -m app.tools.rebalance_shards --bootstrap [--dry-run]
+       (users + refresh_tokens из DATABASE_URL копируются на шард по кольцу, заполняется user_directory);
+    3) запустить сервис с DATABASE_SHARD_URLS. Строки users/refresh_tokens в основной БД остаются как есть
+       (можно откатиться, убрав DATABASE_SHARD_URLS), после проверки их можно удалить вручную.
+Пока директория пуста, а в users основной БД есть пользователи, сервис с DATABASE_SHARD_URLS не стартует.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+from uuid import UUID
+
+import asyncpg
+
+from app.core.config import settings
+from app.core.db import _migrate
+from app.core.logger import get_logger
+from app.core.sharding import HashRing
+
+log = get_logger()
+
+_TOKEN_COLUMNS = ("id", "user_id", "jti", "ip", "user_agent", "revoke_reason", "revoked_at", "expires_at", "created_at")
+
+
+_USER_COLUMNS = ("id", "email", "password_hash", "is_active", "is_superuser", "created_at")
+
+
+async def _lock_user(conn: asyncpg.Connection, user_id) -> tuple[asyncpg.Record | None, list[asyncpg.Record]]:
+    """Читает пользователя и его refresh-токены под FOR UPDATE: пока транзакция открыта,
+    на src не пройдут ни смена пароля, ни revoke, ни выдача нового токена (FK берёт KEY SHARE на users)."""
+
+    user = await conn.fetchrow(f"SELECT {', '.join(_USER_COLUMNS)} FROM users WHERE id = $1 FOR UPDATE", user_id)
+    if not user:
+        return None, []
+    tokens = await conn.fetch(
+        f"SELECT {', '.join(_TOKEN_COLUMNS)} FROM refresh_tokens WHERE user_id = $1 FOR UPDATE", user_id)
+    return user, tokens
+
+
+async def _copy_to(dst: asyncpg.Pool, users: list[asyncpg.Record], tokens: list[asyncpg.Record]) -> None:
+    """Переносит состояние src на dst. Идемпотентно: новые строки вставляются, а отзыв токена
+    и изменения пользователя доезжают и до уже скопированных строк (отзыв на dst не откатываем)."""
+
+    async with dst.acquire() as conn:
+        async with conn.transaction():
+            await conn.executemany(
+                f"""INSERT INTO users ({', '.join(_USER_COLUMNS)}) VALUES ($1, $2, $3, $4, $5, $6)
+                ON CONFLICT (id) DO UPDATE
+                SET password_hash = EXCLUDED.password_hash, is_active = EXCLUDED.is_active,
+                    is_superuser = EXCLUDED.is_superuser""",
+                [tuple(u.values()) for u in users])
+            if tokens:
+                await conn.executemany(
+                    f"""INSERT INTO refresh_tokens ({', '.join(_TOKEN_COLUMNS)})
+                    VALUES ({', '.join(f'${i + 1}' for i in range(len(_TOKEN_COLUMNS)))})
+                    ON CONFLICT (jti) DO UPDATE
+                    SET revoked_at = COALESCE(refresh_tokens.revoked_at, EXCLUDED.revoked_at),
+                        revoke_reason = COALESCE(refresh_tokens.revoke_reason, EXCLUDED.revoke_reason)""",
+                    [tuple(t.values()) for t in tokens])
+
+
+async def _copy_and_switch(src: asyncpg.Pool, dst: asyncpg.Pool, directory: asyncpg.Pool,
+                           email: str, user_id, new_shard: int) -> bool:
+    """Шаг 1 переноса: под FOR UPDATE на src копируем пользователя с refresh-токенами на dst и переключаем
+    директорию. Пока идёт копирование, пользователь на src не меняется, новые запросы после переключения
+    идут уже в dst. False - если на старом шарде его уже нет."""
+
+    async with src.acquire() as conn:
+        async with conn.transaction():
+            user, tokens = await _lock_user(conn, user_id)
+            if not user:
+                return False
+            await _copy_to(dst, [user], tokens)
+            async with directory.acquire() as dconn:
+                await dconn.execute("UPDATE user_directory SET shard = $2 WHERE email = $1", email, new_shard)
+    return True
+
+
+async def _finish_move(src: asyncpg.Pool, dst: asyncpg.Pool, user_id) -> None:
+    """Шаг 2 (после grace): запросы, которые выбрали src до переключения директории, могли дописать туда
+    revoke, смену пароля или новый токен. Снова под FOR UPDATE доносим это на dst и только потом удаляем src -
+    иначе отзыв потерялся бы и токен ожил бы на новом шарде."""
+
+    async with src.acquire() as conn:
+        async with conn.transaction():
+            user, tokens = await _lock_user(conn, user_id)
+            if user:
+                await _copy_to(dst, [user], tokens)
+                await conn.execute("DELETE FROM users WHERE id = $1", user_id)  # refresh_tokens удалятся каскадом
+
+
+async def bootstrap(dry_run: bool, batch: int) -> dict[int, int]:
+    """Первое включение шардирования на существующей БД: копирует users + refresh_tokens из DATABASE_URL
+    на шард по кольцу и заполняет user_directory. Сначала строки на шарде, потом директория -
+    директория никогда не указывает на пользователя, которого на шарде ещё нет.
+    Идемпотентно (ON CONFLICT), строки в основной БД не трогает.
+    Возвращает {номер_шарда: сколько пользователей туда скопировано}."""
+
+    if not settings.DATABASE_SHARD_URLS:
+        raise SystemExit("DATABASE_SHARD_URLS is empty - sharding is disabled")
+
+    ring = HashRing(len(settings.DATABASE_SHARD_URLS))
+    primary = await asyncpg.create_pool(dsn=settings.DATABASE_URL, min_size=1, max_size=2)
+    shards = [await asyncpg.create_pool(dsn=dsn, min_size=1, max_size=2) for dsn in settings.DATABASE_SHARD_URLS]
+    copied: dict[int, int] = {}
+    try:
+        if not dry_run:
+            for pool in [primary] + shards:
+                await _migrate(pool)
+        last_id = UUID(int=0)
+        while True:
+            async with primary.acquire() as conn:
+                users = await conn.fetch(
+                    f"SELECT {', '.join(_USER_COLUMNS)} FROM users WHERE id > $1 ORDER BY id LIMIT $2",
+                    last_id, batch)
+                if not users:
+                    break
+                last_id = users[-1]["id"]
+                tokens = [] if dry_run else await conn.fetch(
+                    f"SELECT {', '.join(_TOKEN_COLUMNS)} FROM refresh_tokens WHERE user_id = ANY($1::uuid[])",
+                    [u["id"] for u in users])
+
+            by_shard: dict[int, list[asyncpg.Record]] = {}
+            for user in users:
+                by_shard.setdefault(ring.shard_for(user["id"]), []).append(user)
+            for shard, shard_users in by_shard.items():
+                copied[shard] = copied.get(shard, 0) + len(shard_users)
+                if dry_run:
+                    continue
+                ids = {u["id"] for u in shard_users}
+                await _copy_to(shards[shard], shard_users, [t for t in tokens if t["user_id"] in ids])
+
+            if not dry_run:
+                async with primary.acquire() as conn:
+                    await conn.executemany(
+                        """INSERT INTO user_directory (email, user_id, shard) VALUES ($1, $2, $3)
+                        ON CONFLICT (email) DO UPDATE SET user_id = EXCLUDED.user_id, shard = EXCLUDED.shard""",
+                        [(u["email"], u["id"], ring.shard_for(u["id"])) for u in users])
+            log.info("bootstrap progress last_id=%s copied=%s", last_id, sum(copied.values()))
+    finally:
+        await primary.close()
+        for pool in shards:
+            await pool.close()
+    return copied
+
+
+async def rebalance(dry_run: bool, batch: int, grace: float) -> dict[int, int]:
+    """Возвращает {номер_шарда: сколько пользователей туда переехало}."""
+
+    if not settings.DATABASE_SHARD_URLS:
+        raise SystemExit("DATABASE_SHARD_URLS is empty - sharding is disabled")
+
+    ring = HashRing(len(settings.DATABASE_SHARD_URLS))
+    directory = await asyncpg.create_pool(dsn=settings.DATABASE_URL, min_size=1, max_size=2)
+    shards = [await asyncpg.create_pool(dsn=dsn, min_size=1, max_size=2) for dsn in settings.DATABASE_SHARD_URLS]
+    moved: dict[int, int] = {}
+    try:
+        last_email = ""
+        while True:
+            async with directory.acquire() as conn:
+                rows = await conn.fetch(
+                    "SELECT email, user_id, shard FROM user_directory WHERE email > $1 ORDER BY email LIMIT $2",
+                    last_email, batch)
+            if not rows:
+                break
+            last_email = rows[-1]["email"]
+
+            switched = []
+            for row in rows:
+                target = ring.shard_for(row["user_id"])
+                if target == row["shard"]:
+                    continue
+                if dry_run:
+                    moved[target] = moved.get(target, 0) + 1
+                    continue
+                src, dst = shards[row["shard"]], shards[target]
+                if await _copy_and_switch(src, dst, directory, row["email"], row["user_id"], target):
+                    switched.append((src, dst, row["user_id"]))
+                    moved[target] = moved.get(target, 0) + 1
+
+            if switched:
+                await asyncio.sleep(grace)  # одна пауза на пачку, а не на каждого пользователя
+                for src, dst, user_id in switched:
+                    await _finish_move(src, dst, user_id)
+            log.info("rebalance progress last_email=%s moved=%s", last_email, sum(moved.values()))
+    finally:
+        await directory.close()
+        for pool in shards:
+            await pool.close()
+    return moved
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Move users to their consistent-hash shard after adding a shard")
+    parser.add_argument("--dry-run", action="store_true", help="только посчитать, сколько пользователей переедет")
+    parser.add_argument("--bootstrap", action="store_true",
+                        help="первое включение шардирования: скопировать users/refresh_tokens из DATABASE_URL на шарды")
+    parser.add_argument("--batch", type=int, default=500, help="сколько строк директории читать за раз")
+    parser.add_argument("--grace", type=float, default=2.0,
+                        help="сколько секунд ждать запросы, начатые до переключения директории, перед удалением со старого шарда")
+    args = parser.parse_args()
+
+    if args.bootstrap:
+        moved = asyncio.run(bootstrap(args.dry_run, args.batch))
+        verb = "would copy" if args.dry_run else "copied"
+    else:
+        moved = asyncio.run(rebalance(args.dry_run, args.batch, args.grace))
+        verb = "would move" if args.dry_run else "moved"
+    for shard, count in sorted(moved.items()):
+        print(f"shard {shard}: {verb} {count} users")
+    print(f"total: {verb} {sum(moved.values())} users")
+
+
+if __name__ == "__main__":
+    main()
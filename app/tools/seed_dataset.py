@@ -0,0 +1,177 @@
+"""Синтетический датасет users / refresh_tokens для scale-тестов.
+
+    python -m app.tools.seed_dataset --users 1000000 --truncate        # ~10 refresh на пользователя
+    python -m app.tools.seed_dataset --users 10000000 --tokens-per-user 10
+    python -m app.tools.seed_dataset --users 100000 --start 1000000    # дописать ещё 100k к уже засеянным
+
+Пишет в DATABASE_URL через COPY пачками; схема (app/migrations) должна быть уже накатана.
+Шардированную схему не заполняет. НЕ запускать на боевой БД: --truncate чистит users и refresh_tokens.
+
+Что получается:
+- email детерминированные (seed0000000042@example.test), поэтому тесты выбирают пользователей по номеру;
+- число refresh на пользователя - с тяжёлым хвостом (Lomax / Pareto II, --skew): у большинства 0-3 сессии,
+  у немногих - сотни и тысячи (боты, интеграции); среднее ~ --tokens-per-user;
+- токены - смесь просроченных, отозванных (rotated / logout / admin) и активных, доли задаются флагами.
+Генератор детерминирован (--seed), одинаковые параметры дают одинаковые данные.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from uuid import UUID
+
+import asyncpg
+
+from app.core.config import settings
+from app.core.logger import get_logger
+
+log = get_logger()
+
+USER_COLUMNS = ("id", "email", "password_hash", "is_active", "is_superuser", "created_at")
+TOKEN_COLUMNS = ("id", "user_id", "jti", "ip", "user_agent", "revoke_reason", "revoked_at", "expires_at", "created_at")
+
+# Хешировать Argon2 миллионы паролей незачем: для чтения важны только длина и вид строки
+PASSWORD_HASH = "$argon2id$v=19$m=65536,t=3,p=4$c2VlZHNlZWRzZWVkc2VlZA$0b1kq0tVn1JkC4x9tW0QmC1cmZy1i3xX2Xy4o0rG8pE"
+MAX_SESSIONS = 10_000
+USER_AGENTS = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0 Safari/537.36",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_5 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Mobile/15E148",
+    "Mozilla/5.0 (X11; Linux x86_64; rv:127.0) Gecko/20100101 Firefox/127.0",
+    "okhttp/4.12.0",
+    "python-requests/2.32.3",
+    None,
+)
+REVOKE_REASONS = ("rotated", "rotated", "rotated", "logout", "password_changed", "admin")
+
+
+def seed_email(n: int) -> str:
+    return f"seed{n:010d}@example.test"
+
+
+class DatasetGenerator:
+    """Строки для COPY. Пользователи нумеруются с start; всё случайное - из rng с фиксированным seed."""
+
+    def __init__(self, tokens_per_user: float, skew: float, expired_share: float, revoked_share: float, seed: int):
+        if skew <= 1:
+            raise ValueError("skew must be > 1 (Lomax has infinite mean otherwise)")
+        if expired_share + revoked_share > 1:
+            raise ValueError("expired_share + revoked_share must be <= 1")
+        self.rng = random.Random(seed)
+        self.sessions_scale = tokens_per_user * (skew - 1)  # среднее Lomax(skew) = 1 / (skew - 1)
+        self.skew = skew
+        self.expired_share = expired_share
+        self.revoked_share = revoked_share
+        self.now = datetime.now(timezone.utc)
+        self.ttl = timedelta(seconds=settings.REFRESH_TOKEN_TTL)
+
+    def _uuid(self) -> UUID:
+        return UUID(int=self.rng.getrandbits(128), version=4)
+
+    def _ago(self, max_seconds: float) -> datetime:
+        return self.now - timedelta(seconds=self.rng.random() * max_seconds)
+
+    def sessions(self) -> int:
+        x = self.sessions_scale * (self.rng.paretovariate(self.skew) - 1)
+        return min(int(x + self.rng.random()), MAX_SESSIONS)  # случайное округление сохраняет среднее
+
+    def users(self, start: int, count: int) -> list[tuple]:
+        return [(self._uuid(), seed_email(n), PASSWORD_HASH, self.rng.random() > 0.02, False,
+                 self._ago(2 * 365 * 86400)) for n in range(start, start + count)]
+
+    def tokens(self, user_id: UUID, user_created_at: datetime) -> list[tuple]:
+        rows = []
+        ttl_s = self.ttl.total_seconds()
+        age_s = (self.now - user_created_at).total_seconds()
+        for _ in range(self.sessions()):
+            roll = self.rng.random()
+            revoke_reason = revoked_at = None
+            if roll < self.expired_share and age_s > ttl_s:
+                # просроченный: выдан раньше, чем TTL назад (часть ещё и отозвана до истечения)
+                created_at = self.now - self.ttl - timedelta(seconds=self.rng.random() * max(age_s - ttl_s, 0))
+                if self.rng.random() < 0.3:
+                    revoke_reason = self.rng.choice(REVOKE_REASONS)
+                    revoked_at = created_at + timedelta(seconds=self.rng.random() * ttl_s)
+            else:
+                created_at = self._ago(min(ttl_s, age_s))
+                if roll < self.expired_share + self.revoked_share:
+                    revoke_reason = self.rng.choice(REVOKE_REASONS)
+                    revoked_at = created_at + (self.now - created_at) * self.rng.random()
+            ip = f"10.{self.rng.randrange(256)}.{self.rng.randrange(256)}.{self.rng.randrange(1, 255)}"
+            rows.append((self._uuid(), user_id, self._uuid(), ip, self.rng.choice(USER_AGENTS),
+                         revoke_reason, revoked_at, created_at + self.ttl, created_at))
+        return rows
+
+
+async def seed(pool: asyncpg.Pool, users: int, start: int = 0, tokens_per_user: float = 10.0, skew: float = 1.5,
+               expired_share: float = 0.4, revoked_share: float = 0.3, batch: int = 50_000,
+               seed_value: int = 42) -> tuple[int, int]:
+    """Дописывает пользователей start..start+users-1 и их refresh-токены. Возвращает (users, tokens)."""
+
+    gen = DatasetGenerator(tokens_per_user, skew, expired_share, revoked_share, seed_value + start)
+    total_tokens = 0
+    started = time.perf_counter()
+    for offset in range(start, start + users, batch):
+        user_rows = gen.users(offset, min(batch, start + users - offset))
+        token_rows = [t for u in user_rows for t in gen.tokens(u[0], u[5])]
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.copy_records_to_table("users", records=user_rows, columns=USER_COLUMNS)
+                await conn.copy_records_to_table("refresh_tokens", records=token_rows, columns=TOKEN_COLUMNS)
+        total_tokens += len(token_rows)
+        done = offset + len(user_rows) - start
+        log.info("seed progress users=%s/%s tokens=%s elapsed=%.0fs",
+                 done, users, total_tokens, time.perf_counter() - started)
+    return users, total_tokens
+
+
+async def truncate(pool: asyncpg.Pool) -> None:
+    async with pool.acquire() as conn:
+        await conn.execute("TRUNCATE refresh_tokens, users")
+
+
+async def analyze(pool: asyncpg.Pool) -> None:
+    """Свежая статистика планировщика после массовой загрузки."""
+
+    async with pool.acquire() as conn:
+        await conn.execute("VACUUM ANALYZE users")
+        await conn.execute("VACUUM ANALYZE refresh_tokens")
+
+
+async def _run(args: argparse.Namespace) -> tuple[int, int]:
+    if settings.DATABASE_SHARD_URLS:
+        raise SystemExit("seed_dataset fills only DATABASE_URL; unset DATABASE_SHARD_URLS")
+
+    pool = await asyncpg.create_pool(dsn=settings.DATABASE_URL, min_size=1, max_size=2)
+    try:
+        if args.truncate:
+            await truncate(pool)
+        result = await seed(pool, args.users, start=args.start, tokens_per_user=args.tokens_per_user,
+                            skew=args.skew, expired_share=args.expired, revoked_share=args.revoked,
+                            batch=args.batch, seed_value=args.seed)
+        await analyze(pool)
+        return result
+    finally:
+        await pool.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Seed synthetic users / refresh_tokens via COPY")
+    parser.add_argument("--users", type=int, required=True, help="сколько пользователей добавить")
+    parser.add_argument("--start", type=int, default=0, help="номер первого пользователя (для дозаливки)")
+    parser.add_argument("--tokens-per-user", type=float, default=10.0, help="среднее число refresh на пользователя")
+    parser.add_argument("--skew", type=float, default=1.5, help="параметр хвоста Lomax (>1, меньше - тяжелее хвост)")
+    parser.add_argument("--expired", type=float, default=0.4, help="доля просроченных токенов")
+    parser.add_argument("--revoked", type=float, default=0.3, help="доля отозванных (не просроченных) токенов")
+    parser.add_argument("--batch", type=int, default=50_000, help="пользователей на одну пачку COPY")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--truncate", action="store_true", help="очистить users и refresh_tokens перед заливкой")
+    args = parser.parse_args()
+
+    users, tokens = asyncio.run(_run(args))
+    print(f"seeded users={users} refresh_tokens={tokens} ({tokens / max(users, 1):.1f} per user)")
+
+
+if __name__ == "__main__":
+    main()
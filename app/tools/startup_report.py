@@ -0,0 +1,53 @@
+"""Отчёт о стоимости импортов при старте воркера.
+
+    python -m app.tools.startup_report            # топ-20 модулей и пакетов по времени импорта
+    python -m app.tools.startup_report --top 50
+
+Запускает `python -X importtime -c "import app.main"` в отдельном процессе (чистый кеш sys.modules)
+и агрегирует результат. Время инициализации (пул, миграции, прогрев) смотрим в GET /ready.
+"""
+from __future__ import annotations
+import argparse
+import subprocess
+import sys
+
+
+def measure() -> list[tuple[str, int, int]]:
+    """[(модуль, self_us, cumulative_us)] в порядке из importtime."""
+
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app.main"],
+                          capture_output=True, text=True, check=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cum_us, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        rows.append((name, int(self_us), int(cum_us)))
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Import-time report for app.main")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    rows = measure()
+    total_us = sum(self_us for _, self_us, _ in rows)
+
+    by_package: dict[str, int] = {}
+    for name, self_us, _ in rows:
+        top = name.split(".")[0] if not name.startswith("app.") else ".".join(name.split(".")[:3])
+        by_package[top] = by_package.get(top, 0) + self_us
+
+    print(f"total import time: {total_us / 1000:.1f} ms ({len(rows)} modules)\n")
+    print(f"{'package / app module':40} {'self ms':>10} {'share':>7}")
+    for name, us in sorted(by_package.items(), key=lambda kv: -kv[1])[:args.top]:
+        print(f"{name:40} {us / 1000:>10.1f} {us / total_us:>7.1%}")
+
+    print(f"\n{'slowest single modules (cumulative)':40} {'cum ms':>10}")
+    for name, _, cum_us in sorted(rows, key=lambda r: -r[2])[:args.top]:
+        print(f"{name:40} {cum_us / 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""Микробенчмарки горячих функций, которые выполняются на каждом запросе.
+
+Запуск:
+    python -m bench.microbench                # сравнить с bench/baselines.json, exit 1 при регрессии
+    python -m bench.microbench --update       # перезаписать baseline
+    python -m bench.microbench --threshold 0.3 --only decode_token
+
+Чтобы результаты были сравнимы между машинами (ноутбук / CI), время каждой функции
+делится на время фиксированной калибровочной нагрузки на чистом Python. В baseline хранится
+это отношение, а не абсолютные микросекунды. Берём минимум из нескольких повторов - он устойчивее к шуму.
+"""
+from __future__ import annotations
+import argparse
+import json
+import logging
+import os
+import pathlib
+import platform
+import statistics
+import sys
+import timeit
+from typing import Callable
+from uuid import UUID
+
+os.environ.setdefault("JWT_SECRET", "bench-secret-bench-secret-bench-secret")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from app.core import security  # noqa: E402
+from app.core.config import settings  # noqa: E402
+from app.core.logger import _mask_private_data, get_logger  # noqa: E402
+
+BASELINE_PATH = pathlib.Path(__file__).resolve().parent / "baselines.json"
+DEFAULT_THRESHOLD = float(os.getenv("BENCH_THRESHOLD", "0.3"))  # +30% к baseline = регрессия
+
+# Argon2 упирается в память: его время почти не зависит от Python-кода и скачет вместе с нагрузкой
+# на память машины (на общих CI-раннерах - до +50%), а калибровка на чистом Python это не компенсирует.
+# Поэтому допуск широкий: ловим только грубые регрессии (например, случайно выросшие параметры хеша).
+THRESHOLD_OVERRIDES = {"hash_password": 0.75, "verify_password": 0.75}
+
+USER_ID = "6f1c2f8e-3b9a-4d57-9a4e-2f0f0d1c8b11"
+EMAIL = "user@example.com"
+JTI = UUID("0b6c8a52-1f5e-4bb4-9a8e-4c2d6a9f7e10")
+
+
+class _FakeRepo:
+    """Первый позиционный аргумент у методов репозиториев - сам репозиторий."""
+
+    def __repr__(self) -> str:
+        return "<RefreshTokensRepo>"
+
+
+# Аргументы так, как их видит simple_logger при вызове RefreshTokensRepo.issue / UsersRepo.update_password_by_id
+_ISSUE_ARGS = (_FakeRepo(),)
+_ISSUE_KWARGS = {"user_id": UUID(USER_ID), "jti": JTI, "exp_ts": 1767225600, "ip": "203.0.113.7",
+                 "user_agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0 Safari/537.36"}
+_UPDATE_PWD_KWARGS = {"user_id": USER_ID, "new_password_hash": "$argon2id$v=19$m=65536,t=3,p=4$c2FsdHNhbHQ$aGFzaGhhc2g"}
+
+
+def _calibration() -> None:
+    """Фиксированная нагрузка на чистом Python: dict/str/int операции, похожие на то, что делает сервис."""
+
+    d = {}
+    for i in range(2000):
+        k = "k" + str(i)
+        d[k] = i * 3
+    sum(v for v in d.values() if v % 2)
+
+
+def _cases() -> dict[str, tuple[Callable[[], object], int]]:
+    """name -> (функция без аргументов, число вызовов в одном замере)."""
+
+    access = security.create_access_token(USER_ID, EMAIL)
+    pwd_hash = security.hash_password("correct horse battery staple")
+
+    def decode_uncached():
+        settings.TOKEN_CACHE_ENABLED = False
+        return security.decode_token(access)
+
+    def decode_cached():
+        settings.TOKEN_CACHE_ENABLED = True
+        try:
+            return security.decode_token(access)
+        finally:
+            settings.TOKEN_CACHE_ENABLED = False
+
+    return {
+        "create_access_token": (lambda: security.create_access_token(USER_ID, EMAIL), 400),
+        "create_refresh_token": (lambda: security.create_refresh_token(USER_ID, EMAIL, JTI), 400),
+        "decode_token": (decode_uncached, 400),
+        "decode_token_cached": (decode_cached, 400),
+        "hash_password": (lambda: security.hash_password("correct horse battery staple"), 1),
+        "verify_password": (lambda: security.verify_password("correct horse battery staple", pwd_hash), 1),
+        "mask_private_data_issue": (lambda: (_mask_private_data(_ISSUE_ARGS), _mask_private_data(_ISSUE_KWARGS)), 1000),
+        "mask_private_data_update_password": (lambda: _mask_private_data(_UPDATE_PWD_KWARGS), 1000),
+        "settings_cookie_expiry": (lambda: settings.cookie_expiry(settings.ACCESS_TOKEN_TTL), 4000),
+        "settings_access_delta": (settings.access_delta, 4000),
+    }
+
+
+def _measure(fn: Callable[[], object], number: int, repeat: int) -> tuple[float, float]:
+    """Минимальное время одного вызова fn и калибровки (сек).
+    Замеры чередуются (калибровка, fn, калибровка, fn, ...), чтобы оба видели одинаковые условия машины."""
+
+    fn()  # прогрев
+    calib_timer = timeit.Timer(_calibration)
+    fn_timer = timeit.Timer(fn)
+    calib_best = fn_best = float("inf")
+    for _ in range(repeat):
+        calib_best = min(calib_best, calib_timer.timeit(number=20) / 20)
+        fn_best = min(fn_best, fn_timer.timeit(number=number) / number)
+    return fn_best, calib_best
+
+
+def run(only: list[str] | None, repeat: int) -> dict[str, dict[str, float]]:
+    results: dict[str, dict[str, float]] = {}
+    for name, (fn, number) in _cases().items():
+        if only and name not in only:
+            continue
+        per_call, calib = _measure(fn, number, repeat)
+        results[name] = {"us": round(per_call * 1e6, 3), "ratio": round(per_call / calib, 5)}
+    return results
+
+
+def compare(results: dict[str, dict[str, float]], baseline: dict[str, dict[str, float]], threshold: float) -> list[str]:
+    """Печатает таблицу и возвращает список регрессий."""
+
+    regressions = []
+    print(f"{'benchmark':38} {'us/call':>12} {'ratio':>10} {'baseline':>10} {'change':>8}")
+    for name, res in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:38} {res['us']:>12.3f} {res['ratio']:>10.5f} {'-':>10} {'new':>8}")
+            continue
+        change = res["ratio"] / base["ratio"] - 1
+        limit = max(threshold, THRESHOLD_OVERRIDES.get(name, 0))
+        mark = ""
+        if change > limit:
+            regressions.append(f"{name}: +{change:.0%} (threshold {limit:.0%})")
+            mark = "  REGRESSION"
+        print(f"{name:38} {res['us']:>12.3f} {res['ratio']:>10.5f} {base['ratio']:>10.5f} {change:>+8.0%}{mark}")
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Microbenchmarks for per-request core functions")
+    parser.add_argument("--update", action="store_true", help="перезаписать baseline текущими результатами")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="допустимый рост, доля (0.3 = +30%%)")
+    parser.add_argument("--repeat", type=int, default=15, help="число повторов, берём минимум")
+    parser.add_argument("--only", nargs="*", help="запустить только указанные бенчмарки")
+    args = parser.parse_args(argv)
+
+    get_logger().setLevel(logging.WARNING)
+
+    if args.update:
+        # baseline - медиана нескольких прогонов, чтобы случайно "быстрый" прогон не стал планкой
+        runs = [run(args.only, args.repeat) for _ in range(3)]
+        results = {name: {k: statistics.median(r[name][k] for r in runs) for k in ("us", "ratio")} for name in runs[0]}
+        # --only обновляет только свои бенчмарки, остальные baseline остаются как были
+        existing = json.loads(BASELINE_PATH.read_text(encoding="utf-8"))["benchmarks"] if BASELINE_PATH.exists() else {}
+        data = {"python": platform.python_version(), "benchmarks": {**existing, **results}}
+        BASELINE_PATH.write_text(json.dumps(data, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+        print(f"baseline written: {BASELINE_PATH}")
+        return 0
+
+    results = run(args.only, args.repeat)
+    data = json.loads(BASELINE_PATH.read_text(encoding="utf-8")) if BASELINE_PATH.exists() else {}
+    baseline = data.get("benchmarks", {})
+    if data.get("python") and data["python"].rsplit(".", 1)[0] != platform.python_version().rsplit(".", 1)[0]:
+        print(f"warning: baseline recorded on python {data['python']}, running {platform.python_version()} - "
+              f"ratios may shift, consider --update on the target interpreter\n")
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print("\nregressions:\n  " + "\n  ".join(regressions))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,64 @@
+import asyncio
+
+from app.core.admission import Gate
+
+
+def test_acquire_within_limit_and_release():
+    async def run():
+        gate = Gate("read", limit=2, queue_size=0, timeout=0.01)
+        assert await gate.acquire()
+        assert await gate.acquire()
+        assert gate.stats() == {"limit": 2, "active": 2, "waiting": 0, "rejected": 0}
+        gate.release()
+        gate.release()
+        return gate
+
+    assert asyncio.run(run()).stats() == {"limit": 2, "active": 0, "waiting": 0, "rejected": 0}
+
+
+def test_reject_when_queue_is_full():
+    async def run():
+        gate = Gate("hash", limit=1, queue_size=1, timeout=1)
+        assert await gate.acquire()
+        waiter = asyncio.create_task(gate.acquire())
+        await asyncio.sleep(0)
+        assert gate.waiting == 1
+        assert not await gate.acquire()  # очередь полна - сразу отказ, без ожидания
+        gate.release()
+        assert await waiter
+        return gate
+
+    gate = asyncio.run(run())
+    assert gate.rejected == 1
+    assert gate.active == 1
+    assert gate.waiting == 0
+
+
+def test_reject_after_queue_deadline():
+    async def run():
+        gate = Gate("token", limit=1, queue_size=4, timeout=0.01)
+        assert await gate.acquire()
+        ok = await gate.acquire()
+        return gate, ok
+
+    gate, ok = asyncio.run(run())
+    assert not ok
+    assert gate.rejected == 1
+    assert gate.waiting == 0
+    assert gate.active == 1
+
+
+def test_release_lets_queued_request_in():
+    async def run():
+        gate = Gate("read", limit=1, queue_size=4, timeout=1)
+        assert await gate.acquire()
+        waiter = asyncio.create_task(gate.acquire())
+        await asyncio.sleep(0)
+        gate.release()
+        ok = await waiter
+        gate.release()
+        return gate, ok
+
+    gate, ok = asyncio.run(run())
+    assert ok
+    assert gate.stats() == {"limit": 1, "active": 0, "waiting": 0, "rejected": 0}
@@ -0,0 +1,64 @@
+import asyncio
+import json
+from uuid import uuid4
+
+from app.core.revocations import RevocationHub, notify_revocation
+
+
+class _Conn:
+    """Соединение, которое запоминает pg_notify вместо отправки в БД."""
+
+    def __init__(self):
+        self.payloads: list[str] = []
+
+    async def execute(self, query: str, channel: str, payload: str) -> None:
+        self.payloads.append(payload)
+
+
+def _notify(hub: RevocationHub, user_id: str, jti: str, reason: str, replaced_by: str | None = None) -> None:
+    conn = _Conn()
+    asyncio.run(notify_revocation(conn, "session_revoked", user_id, jti=jti, reason=reason, replaced_by=replaced_by))
+    for payload in conn.payloads:
+        hub.dispatch(json.loads(payload))
+
+
+def _session() -> tuple[RevocationHub, str, str, asyncio.Queue]:
+    hub = RevocationHub(max_connections=10, max_per_user=10, queue_size=4)
+    user_id, jti = str(uuid4()), str(uuid4())
+    sub = hub.subscribe(user_id, jti)
+    return hub, user_id, jti, sub.queue
+
+
+def test_rotation_sends_nothing_to_stream():
+    hub, user_id, jti, queue = _session()
+    _notify(hub, user_id, jti, "rotated", replaced_by=str(uuid4()))
+    assert queue.qsize() == 0
+
+
+def test_logout_reaches_stream():
+    hub, user_id, jti, queue = _session()
+    _notify(hub, user_id, jti, "logout")
+    assert queue.qsize() == 1
+    assert queue.get_nowait()["kind"] == "session_revoked"
+
+
+def test_logout_after_rotation_reaches_stream():
+    hub, user_id, jti, queue = _session()
+    new_jti = str(uuid4())
+    _notify(hub, user_id, jti, "rotated", replaced_by=new_jti)
+    _notify(hub, user_id, new_jti, "logout")
+    assert queue.qsize() == 1
+    assert queue.get_nowait()["jti"] == new_jti
+
+
+def test_logout_of_old_jti_after_rotation_is_ignored():
+    hub, user_id, jti, queue = _session()
+    _notify(hub, user_id, jti, "rotated", replaced_by=str(uuid4()))
+    _notify(hub, user_id, jti, "logout")
+    assert queue.qsize() == 0
+
+
+def test_logout_of_other_session_is_ignored():
+    hub, user_id, _, queue = _session()
+    _notify(hub, user_id, str(uuid4()), "logout")
+    assert queue.qsize() == 0
@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+from app.core.singleflight import SingleFlight
+
+
+def test_concurrent_calls_are_coalesced():
+    async def run():
+        flight = SingleFlight()
+        calls = 0
+
+        async def fetch():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return {"id": 1}
+
+        results = await asyncio.gather(*(flight.do("users.get_by_id", ("u1",), fetch, label="u1") for _ in range(5)))
+        return flight, calls, results
+
+    flight, calls, results = asyncio.run(run())
+    assert calls == 1
+    assert results == [{"id": 1}] * 5
+    assert flight.stats() == {"users.get_by_id": {"calls": 5, "executed": 1, "coalesced": 4}}
+    assert flight.hot_keys() == {"users.get_by_id": [("u1", 4)]}
+    assert flight.inflight() == 0
+
+
+def test_different_keys_are_not_coalesced():
+    async def run():
+        flight = SingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.01)
+
+        await asyncio.gather(flight.do("op", "a", fetch), flight.do("op", "b", fetch))
+        return flight
+
+    assert asyncio.run(run()).stats()["op"] == {"calls": 2, "executed": 2, "coalesced": 0}
+
+
+def test_next_call_after_completion_runs_again():
+    async def run():
+        flight = SingleFlight()
+        calls = 0
+
+        async def fetch():
+            nonlocal calls
+            calls += 1
+
+        await flight.do("op", "a", fetch)
+        await flight.do("op", "a", fetch)
+        return calls
+
+    assert asyncio.run(run()) == 2
+
+
+def test_exception_is_shared_by_all_waiters():
+    async def run():
+        flight = SingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("db down")
+
+        results = await asyncio.gather(*(flight.do("op", "a", fetch) for _ in range(3)), return_exceptions=True)
+        return flight, results
+
+    flight, results = asyncio.run(run())
+    assert all(isinstance(r, RuntimeError) and str(r) == "db down" for r in results)
+    assert flight.stats()["op"]["executed"] == 1
+    assert flight.inflight() == 0
+
+
+def test_cancelled_waiter_does_not_cancel_shared_call():
+    async def run():
+        flight = SingleFlight()
+        started = asyncio.Event()
+
+        async def fetch():
+            started.set()
+            await asyncio.sleep(0.02)
+            return "row"
+
+        first = asyncio.create_task(flight.do("op", "a", fetch))
+        second = asyncio.create_task(flight.do("op", "a", fetch))
+        await started.wait()
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(run()) == "row"
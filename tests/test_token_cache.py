@@ -0,0 +1,98 @@
+import time
+
+import jwt
+import pytest
+from fastapi import HTTPException
+
+from app.core import security
+from app.core.config import settings
+from app.core.security import TokenCache, create_access_token, decode_token
+
+
+@pytest.fixture
+def cache(monkeypatch) -> TokenCache:
+    cache = TokenCache(max_bytes=64 * 1024)
+    monkeypatch.setattr(settings, "TOKEN_CACHE_ENABLED", True)
+    monkeypatch.setattr(settings, "JWT_SECRET", "test-secret-test-secret-test-secret")
+    monkeypatch.setattr(security, "token_cache", cache)
+    return cache
+
+
+def _payload(exp: int, n: int = 0) -> dict:
+    return {"sub": f"user-{n}", "type": "access", "exp": exp}
+
+
+def test_get_after_exp_returns_none(monkeypatch):
+    cache = TokenCache(max_bytes=64 * 1024)
+    now = time.time()
+    cache.put("token", _payload(int(now) + 10))
+    assert cache.get("token")["sub"] == "user-0"
+
+    monkeypatch.setattr(security.time, "time", lambda: now + 11)
+    assert cache.get("token") is None
+    assert cache.expired == 1
+    assert cache.size == 0
+
+
+def test_expired_token_is_not_served_from_cache(cache):
+    token = jwt.encode(_payload(int(time.time()) - 5), settings.JWT_SECRET, algorithm=settings.JWT_ALG)
+    cache.put(token, jwt.decode(token, options={"verify_signature": False}))  # устаревшая запись в кеше
+
+    with pytest.raises(HTTPException) as e:
+        decode_token(token)
+    assert e.value.status_code == 401
+    assert cache.hits == 0
+
+
+def test_tampered_token_misses_cache_and_is_rejected(cache):
+    token = create_access_token(user_id="u1", email="u1@example.test")
+    assert decode_token(token)["sub"] == "u1"
+    assert decode_token(token)["sub"] == "u1"
+    assert cache.hits == 1
+
+    header, body, signature = token.split(".")
+    tampered = ".".join([header, body, signature[:-2] + ("AA" if signature[-2:] != "AA" else "BB")])
+    with pytest.raises(HTTPException) as e:
+        decode_token(tampered)
+    assert e.value.status_code == 401
+    assert cache.hits == 1
+    assert len(cache._data) == 1
+
+
+def test_cached_payload_is_a_copy(cache):
+    token = create_access_token(user_id="u1", email="u1@example.test")
+    decode_token(token)["sub"] = "someone-else"
+    assert decode_token(token)["sub"] == "u1"
+
+
+def test_eviction_keeps_size_within_budget():
+    cache = TokenCache(max_bytes=2048)
+    exp = int(time.time()) + 60
+    for n in range(50):
+        cache.put(f"token-{n}", _payload(exp, n))
+        assert cache.size <= cache.max_bytes
+
+    assert cache.evictions == 50 - len(cache._data)
+    assert cache.evictions > 0
+    assert cache.get("token-0") is None      # самые старые вытеснены
+    assert cache.get("token-49") is not None
+
+
+def test_eviction_is_lru():
+    cache = TokenCache(max_bytes=2048)
+    exp = int(time.time()) + 60
+    cache.put("token-0", _payload(exp, 0))
+    n = 1
+    while cache.evictions == 0:
+        cache.get("token-0")  # держим первый токен самым свежим
+        cache.put(f"token-{n}", _payload(exp, n))
+        n += 1
+    assert cache.get("token-0") is not None
+    assert cache.get("token-1") is None
+
+
+def test_entry_larger_than_budget_is_not_cached():
+    cache = TokenCache(max_bytes=300)
+    cache.put("token", {**_payload(int(time.time()) + 60), "blob": "x" * 500})
+    assert cache.get("token") is None
+    assert cache.size == 0